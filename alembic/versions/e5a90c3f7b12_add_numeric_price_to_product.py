@@ -0,0 +1,65 @@
+"""Add numeric price columns to Product
+
+Revision ID: e5a90c3f7b12
+Revises: d83f2a61c5e4
+Create Date: 2026-10-18 13:05:44.930251
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a90c3f7b12'
+down_revision: Union[str, Sequence[str], None] = 'd83f2a61c5e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _minor_units(text):
+    match = re.search(r"\d[\d,]*(?:\.\d+)?", text or "")
+    if not match:
+        return None
+    whole, _, fraction = match.group(0).replace(",", "").partition(".")
+    return int(whole) * 100 + int((fraction + "00")[:2])
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('last_price_minor', sa.BigInteger(), nullable=True))
+    op.add_column('products', sa.Column('price_currency', sa.String(length=3), nullable=True))
+
+    # Backfill from the legacy string column
+    products = sa.table(
+        'products',
+        sa.column('id', sa.Integer),
+        sa.column('last_known_price', sa.String),
+        sa.column('last_price_minor', sa.BigInteger),
+        sa.column('price_currency', sa.String),
+    )
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(products.c.id, products.c.last_known_price)
+        .where(products.c.last_known_price.isnot(None))
+    ).all()
+    updates = [
+        {"pid": pid, "minor": _minor_units(text), "currency": "USD" if "$" in text else "INR"}
+        for pid, text in rows
+        if _minor_units(text) is not None
+    ]
+    if updates:
+        conn.execute(
+            products.update()
+            .where(products.c.id == sa.bindparam("pid"))
+            .values(last_price_minor=sa.bindparam("minor"), price_currency=sa.bindparam("currency")),
+            updates,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('products', 'price_currency')
+    op.drop_column('products', 'last_price_minor')
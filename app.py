@@ -1,10 +1,12 @@
 from telegram.ext import ApplicationBuilder, MessageHandler, CallbackQueryHandler, CommandHandler, filters
-from handlers import handle_message, stop_tracking_callback, start_command, help_command, list_command, stats_command, clear_command
+from handlers import handle_message, stop_tracking_callback, start_command, help_command, list_command, stats_command, clear_command, digest_command
 import os
 import sys
 import signal
 import logging
 from dotenv import load_dotenv
+from redis_client import close_redis
+from db import async_engine
 
 # Set up logging
 logging.basicConfig(
@@ -41,6 +43,11 @@ async def error_handler(update, context):
         except Exception as e:
             logger.error(f"Failed to send error message: {e}")
 
+async def on_shutdown(app):
+    """Release pooled connections when the bot stops."""
+    await close_redis()
+    await async_engine.dispose()
+
 if __name__ == "__main__":
     if not BOT_TOKEN:
         logger.error("BOT_TOKEN not found in environment variables!")
@@ -51,7 +58,7 @@ if __name__ == "__main__":
     signal.signal(signal.SIGTERM, signal_handler)
     
     try:
-        app = ApplicationBuilder().token(BOT_TOKEN).build()
+        app = ApplicationBuilder().token(BOT_TOKEN).post_shutdown(on_shutdown).build()
         
         # Add error handler
         app.add_error_handler(error_handler)
@@ -62,6 +69,7 @@ if __name__ == "__main__":
         app.add_handler(CommandHandler("list", list_command))
         app.add_handler(CommandHandler("stats", stats_command))
         app.add_handler(CommandHandler("clear", clear_command))
+        app.add_handler(CommandHandler("digest", digest_command))
         
         # Message and callback handlers
         app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
@@ -0,0 +1,326 @@
+"""
+End-to-end poller + notification benchmark with no external services.
+
+Stand-ins:
+- a local HTTP server (separate process) serves the product pages in
+  benchmarks/fixtures/ with configurable latency and padding, and changes
+  each product's price on a fraction of requests;
+- the same server answers the Telegram Bot API methods the bot uses
+  (getMe, sendMessage), so real telegram.Bot calls go over HTTP;
+- an in-memory publisher replaces Kafka between the poller and the
+  notification side;
+- the database is a throwaway SQLite file, or DATABASE_URL (e.g. a local
+  Postgres) if set.
+
+It seeds --products products (half Amazon, half Flipkart) tracked by
+--watchers users each, runs poller.run_poll_cycle() once over all of them,
+then delivers every published event with notification_worker.handle_event
+through the rate-limited TelegramSender, and reports products/s, p50/p99
+scrape latency, notifications/s and peak RSS.
+
+    python benchmarks/e2e_bench.py --products 10000 --latency-ms 50 --mutation-rate 0.1
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import threading
+import multiprocessing
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+BOT_TOKEN = "123456:bench"
+
+
+def base_price_minor(i: int) -> int:
+    """Seeded price of product i, in paise (whole rupees so both sites render it alike)."""
+    return (499 + (i * 7919) % 50000) * 100
+
+
+def amazon_id(i: int) -> str:
+    return f"B{i:09d}"
+
+
+def flipkart_id(i: int) -> str:
+    return f"itm{i:013d}"
+
+
+# ── Fixture server (runs in its own process) ──────────────────
+
+def _serve(port_queue, latency_ms: float, telegram_latency_ms: float,
+           mutation_rate: float, page_kb: int, seed: int):
+    templates = {}
+    for site in ("amazon", "flipkart"):
+        with open(os.path.join(FIXTURES, f"{site}_product.html"), encoding="utf-8") as f:
+            templates[site] = f.read().replace("{{PADDING}}", "x" * (page_kb * 1024))
+    prices: dict[int, int] = {}
+    lock = threading.Lock()
+    rng = random.Random(seed)
+    message_ids = iter(range(1, 1 << 62))
+
+    def current_price(i: int) -> int:
+        with lock:
+            price = prices.get(i, base_price_minor(i))
+            if rng.random() < mutation_rate:
+                rupees = price // 100
+                step = max(1, rupees * rng.randint(1, 10) // 100)
+                price = max(100, (rupees + rng.choice((-step, step))) * 100)
+            prices[i] = price
+            return price
+
+    def pause(ms: float):
+        if ms > 0:
+            time.sleep(rng.uniform(0.5, 1.5) * ms / 1000)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            # /amazon/dp/B000000042 or /flipkart/product/p/itm0000000000042
+            parts = self.path.split("?")[0].strip("/").split("/")
+            site, product_id = parts[0], parts[-1]
+            if site not in templates:
+                return self._send(404, b"not found", "text/plain")
+            i = int(product_id.lstrip("Bitm"))
+            price = current_price(i)
+            pause(latency_ms)
+            rupees = price // 100
+            html = (
+                templates[site]
+                .replace("{{NAME}}", f"Benchmark {site} product {i}")
+                .replace("{{PRODUCT_ID}}", product_id)
+                .replace("{{PRICE_WHOLE}}", f"{rupees:,}")
+                .replace("{{PRICE_AMOUNT}}", str(rupees))
+                .replace("{{MRP}}", f"{rupees * 2:,}")
+            )
+            self._send(200, html.encode(), "text/html; charset=utf-8")
+
+        def do_POST(self):
+            # /bot<token>/<method>, as telegram.Bot(base_url=...) calls it
+            method = self.path.rsplit("/", 1)[-1]
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode()
+            if "json" in (self.headers.get("Content-Type") or ""):
+                params = json.loads(body or "{}")
+            else:
+                params = {k: v[0] for k, v in parse_qs(body).items()}
+            pause(telegram_latency_ms)
+            if method == "getMe":
+                result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+            elif method == "sendMessage":
+                with lock:
+                    message_id = next(message_ids)
+                result = {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                    "text": params.get("text", ""),
+                }
+            else:
+                result = True
+            self._send(200, json.dumps({"ok": True, "result": result}).encode(), "application/json")
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024  # the default backlog of 5 drops bursts of connects
+
+    server = Server(("127.0.0.1", 0), Handler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+# ── Kafka stand-in ─────────────────────────────────────────────
+
+class InMemoryPublisher:
+    """PriceEventPublisher interface, keeping events in a list."""
+
+    def __init__(self):
+        self.events: list[dict] = []
+
+    async def publish(self, event: dict, key=None):
+        self.events.append(event)
+
+    async def flush(self):
+        return []
+
+    async def stop(self):
+        pass
+
+
+# ── Benchmark ──────────────────────────────────────────────────
+
+def _seed(base_url: str, products: int, watchers: int):
+    from sqlalchemy import insert
+    from db import engine
+    from models import User, Product, user_tracked_products
+    from utils.price import Price
+
+    users = max(watchers, products // 10)
+    chunk = 10_000
+    with engine.begin() as conn:
+        for start in range(0, users, chunk):
+            conn.execute(insert(User), [
+                {"id": u + 1, "telegram_id": 10_000_000 + u, "username": f"bench{u}"}
+                for u in range(start, min(users, start + chunk))
+            ])
+        for start in range(0, products, chunk):
+            rows, links = [], []
+            for i in range(start, min(products, start + chunk)):
+                price = Price(base_price_minor(i))
+                if i % 2:
+                    url = f"{base_url}/flipkart/product/p/{flipkart_id(i)}"
+                    product_id = flipkart_id(i)
+                else:
+                    url = f"{base_url}/amazon/dp/{amazon_id(i)}"
+                    product_id = amazon_id(i)
+                rows.append({
+                    "id": i + 1, "product_id": product_id, "product_url": url,
+                    "product_name": f"Benchmark product {i}",
+                    "last_known_price": str(price), "last_price_minor": price.minor_units,
+                    "price_currency": price.currency,
+                })
+                links.extend(
+                    {"user_id": (i * watchers + w) % users + 1, "product_id": i + 1}
+                    for w in range(watchers)
+                )
+            conn.execute(insert(Product), rows)
+            conn.execute(insert(user_tracked_products), links)
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def bench_poll(publisher: InMemoryPublisher):
+    import poller
+
+    latencies: list[float] = []
+    fetch = poller.fetch_new_price
+
+    async def timed_fetch(url):
+        started = time.perf_counter()
+        try:
+            return await fetch(url)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    async def get_publisher(topic=None):
+        return publisher
+
+    poller.fetch_new_price = timed_fetch
+    poller.get_publisher = get_publisher
+    started = time.perf_counter()
+    await poller.run_poll_cycle()
+    return time.perf_counter() - started, latencies
+
+
+async def bench_notify(base_url: str, events: list[dict], batch: int):
+    from telegram import Bot
+    from telegram.request import HTTPXRequest
+    from telegram_sender import TelegramSender, SENDER_WORKERS
+    from notification_worker import handle_event
+
+    bot = Bot(BOT_TOKEN, base_url=f"{base_url}/bot",
+              request=HTTPXRequest(connection_pool_size=SENDER_WORKERS))
+    sender = TelegramSender()
+    async with bot:
+        await sender.start()
+        started = time.perf_counter()
+        for i in range(0, len(events), batch):
+            await asyncio.gather(*(handle_event(bot, e, sender) for e in events[i:i + batch]))
+        elapsed = time.perf_counter() - started
+        stats = sender.stats()
+        await sender.stop()
+    return elapsed, stats
+
+
+async def main(args, base_url: str):
+    print(f"Seeding {args.products} products x {args.watchers} watchers ...")
+    started = time.perf_counter()
+    _seed(base_url, args.products, args.watchers)
+    print(f"  seeded in {time.perf_counter() - started:.1f}s")
+
+    publisher = InMemoryPublisher()
+    elapsed, latencies = await bench_poll(publisher)
+    print(f"Poll:    {len(latencies)} products in {elapsed:.2f}s = {len(latencies) / elapsed:,.0f} products/s; "
+          f"scrape latency p50 {_percentile(latencies, 50) * 1000:.0f}ms, "
+          f"p99 {_percentile(latencies, 99) * 1000:.0f}ms; {len(publisher.events)} price changes")
+
+    notifications = sum(len(e["user_telegram_ids"]) for e in publisher.events)
+    if notifications:
+        elapsed, stats = await bench_notify(base_url, publisher.events, args.event_batch)
+        print(f"Notify:  {notifications} notifications in {elapsed:.2f}s = {notifications / elapsed:,.0f}/s "
+              f"(sender stats: {stats})")
+    print(f"Peak RSS: {_peak_rss_mb():,.0f} MB (this process; scrape workers and the fixture server excluded)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--watchers", type=int, default=2, help="users tracking each product")
+    parser.add_argument("--latency-ms", type=float, default=50, help="mean product page latency")
+    parser.add_argument("--page-kb", type=int, default=200, help="padding added to each page")
+    parser.add_argument("--mutation-rate", type=float, default=0.1, help="share of fetches that change the price")
+    parser.add_argument("--telegram-latency-ms", type=float, default=20)
+    parser.add_argument("--telegram-rate", type=float, default=0,
+                        help="SENDER_GLOBAL_RATE; 0 = unlimited (measure the pipeline, not the Telegram cap)")
+    parser.add_argument("--concurrency", type=int, default=50, help="MAX_CONCURRENT_SCRAPES")
+    parser.add_argument("--scrape-workers", type=int, default=0, help="SCRAPE_WORKERS")
+    parser.add_argument("--event-batch", type=int, default=1000, help="events delivered concurrently")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # Configure the repo modules before they are imported
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/e2e_bench.db")
+    os.environ["MAX_CONCURRENT_SCRAPES"] = str(args.concurrency)
+    os.environ["SCRAPE_WORKERS"] = str(args.scrape_workers)
+    os.environ["HTTP_TIER_ENABLED"] = "1"
+    os.environ["SENDER_GLOBAL_RATE"] = str(args.telegram_rate or 1e9)
+    os.environ["SENDER_PER_CHAT_INTERVAL"] = "0"
+    os.environ["SENDER_WORKERS"] = str(max(30, args.concurrency))
+    os.environ["DIGEST_DEFAULT_WINDOW"] = "0"
+
+    ctx = multiprocessing.get_context("spawn")
+    port_queue = ctx.Queue()
+    server = ctx.Process(
+        target=_serve, daemon=True,
+        args=(port_queue, args.latency_ms, args.telegram_latency_ms,
+              args.mutation_rate, args.page_kb, args.seed),
+    )
+    server.start()
+    try:
+        base_url = f"http://127.0.0.1:{port_queue.get(timeout=10)}"
+        import logging
+        logging.basicConfig(level=logging.WARNING)
+        asyncio.run(main(args, base_url))
+    finally:
+        server.terminate()
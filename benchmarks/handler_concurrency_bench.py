@@ -0,0 +1,131 @@
+"""
+Show how many bot updates are served concurrently under a slow database.
+
+Every SQL statement is delayed by --delay-ms (an SQLite trace callback that
+sleeps in whichever thread runs the statement). --updates /stats requests
+are then handled at once, first with the old blocking Session queries on
+the event loop and then through handlers.stats_command on the async
+engine. The report gives wall time and the longest event-loop stall, which
+is how long every other user's update had to wait.
+
+    python benchmarks/handler_concurrency_bench.py --updates 50 --delay-ms 20
+
+Runs against a throwaway SQLite file unless DATABASE_URL is set.
+"""
+
+import os
+import sys
+import time
+import types
+import asyncio
+import argparse
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from sqlalchemy import event
+from db import Session, engine, async_engine
+from models import User, Product
+import handlers
+
+DELAY = 0.0
+
+
+def _slow(statement):
+    time.sleep(DELAY)
+
+
+@event.listens_for(engine, "connect")
+def _slow_sync(dbapi_connection, _):
+    if hasattr(dbapi_connection, "set_trace_callback"):
+        dbapi_connection.set_trace_callback(_slow)
+
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def _slow_async(dbapi_connection, _):
+    if hasattr(dbapi_connection, "run_async"):
+        dbapi_connection.run_async(lambda conn: conn.set_trace_callback(_slow))
+
+
+class _Message:
+    async def reply_text(self, text, **kwargs):
+        pass
+
+
+def _update(telegram_id: int):
+    return types.SimpleNamespace(
+        message=_Message(),
+        effective_user=types.SimpleNamespace(id=telegram_id, username=None),
+        effective_chat=types.SimpleNamespace(id=telegram_id),
+    )
+
+
+async def sync_stats(update, context):
+    """The /stats database work as it ran before: sync Session on the event loop."""
+    session = Session()
+    try:
+        user = session.query(User).filter_by(telegram_id=update.effective_user.id).first()
+        _ = len(user.tracked_products) if user else 0
+        session.query(Product).count()
+        session.query(User).count()
+    finally:
+        session.close()
+
+
+async def _watch_loop(stop: asyncio.Event, stalls: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        stalls.append(time.perf_counter() - started - 0.001)
+
+
+async def run(handler, updates: int):
+    stop, stalls = asyncio.Event(), []
+    watcher = asyncio.create_task(_watch_loop(stop, stalls))
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    await asyncio.gather(*(handler(_update(i), None) for i in range(updates)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await watcher
+    return elapsed, max(stalls, default=0.0)
+
+
+def _seed(users: int):
+    session = Session()
+    try:
+        if session.query(User).count() == 0:
+            for i in range(users):
+                user = User(telegram_id=i, username=f"user{i}")
+                user.tracked_products = [
+                    Product(product_id=f"B0{i:04d}{j:04d}", product_url="https://www.amazon.in/dp/x",
+                            last_known_price="₹1,299", product_name=f"Product {j}")
+                    for j in range(3)
+                ]
+                session.add(user)
+            session.commit()
+    finally:
+        session.close()
+
+
+async def main():
+    global DELAY
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--updates", type=int, default=50)
+    parser.add_argument("--delay-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    engine.dispose()  # reconnect so pooled connections get the delay hook
+    _seed(args.updates)
+    DELAY = args.delay_ms / 1000
+    for label, handler in (("sync Session on the loop", sync_stats),
+                           ("async engine", handlers.stats_command)):
+        elapsed, stall = await run(handler, args.updates)
+        print(f"{label}: {args.updates} concurrent /stats in {elapsed:.2f}s "
+              f"({args.updates / elapsed:,.0f} updates/s), longest loop stall {stall * 1000:.0f}ms")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
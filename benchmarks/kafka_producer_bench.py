@@ -0,0 +1,76 @@
+"""
+Measure how many price-change events/sec the poller's Kafka publisher sustains.
+
+Publishes N synthetic events through PriceEventPublisher (the same
+batching/compression/idempotence settings as the poller) against
+KAFKA_BOOTSTRAP_SERVERS and reports the rate, optionally next to the old
+one-round-trip-per-event send_and_wait path.
+
+    python benchmarks/kafka_producer_bench.py --events 50000 --compare
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from kafka_queue import TOPIC, get_producer, get_publisher
+
+
+def _event(i: int) -> dict:
+    return {
+        "product_id": f"B0{i:08d}",
+        "product_url": f"https://www.amazon.in/dp/B0{i:08d}",
+        "product_name": f"Benchmark product {i}",
+        "old_price": "₹1,299",
+        "new_price": "₹1,199",
+        "old_price_minor": 129900,
+        "new_price_minor": 119900,
+        "currency": "INR",
+        "user_telegram_ids": list(range(i % 20)),
+    }
+
+
+async def bench_publisher(n: int) -> float:
+    publisher = await get_publisher()
+    try:
+        start = time.perf_counter()
+        for i in range(n):
+            await publisher.publish(_event(i))
+        failures = await publisher.flush()
+        elapsed = time.perf_counter() - start
+    finally:
+        await publisher.producer.stop()
+    print(f"batched fire-and-forget: {n} events in {elapsed:.2f}s "
+          f"= {n / elapsed:,.0f} events/s ({len(failures)} failed)")
+    return n / elapsed
+
+
+async def bench_send_and_wait(n: int) -> float:
+    producer = await get_producer()
+    try:
+        start = time.perf_counter()
+        for i in range(n):
+            await producer.send_and_wait(TOPIC, value=_event(i), key=_event(i)["product_id"])
+        elapsed = time.perf_counter() - start
+    finally:
+        await producer.stop()
+    print(f"send_and_wait per event: {n} events in {elapsed:.2f}s = {n / elapsed:,.0f} events/s")
+    return n / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--compare", action="store_true",
+                        help="also time send_and_wait (uses events/10)")
+    args = parser.parse_args()
+    await bench_publisher(args.events)
+    if args.compare:
+        await bench_send_and_wait(max(1, args.events // 10))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
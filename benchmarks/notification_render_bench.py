@@ -0,0 +1,69 @@
+"""
+Measure per-message CPU of sending price-change cards to many recipients.
+
+Sends the cards for synthetic events (each with --recipients chats) to a
+bot stub that drops every message, once rendering the text and keyboard
+for every recipient (the old behaviour) and once through the shared
+render cache, and reports CPU microseconds per message.
+
+    python benchmarks/notification_render_bench.py --events 200 --recipients 50
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import notifier
+from utils.price import Price
+
+
+class NullBot:
+    async def send_message(self, **kwargs):
+        pass
+
+
+async def _send_all(events: int, recipients: int):
+    bot = NullBot()
+    for i in range(events):
+        for chat_id in range(recipients):
+            await notifier.send_price_notification_card(
+                bot=bot,
+                chat_id=chat_id,
+                product_url=f"https://www.amazon.in/dp/B0{i:08d}",
+                price=Price(119900),
+                product_id=f"B0{i:08d}",
+                product_name=f"Benchmark product {i}",
+                old_price=Price(129900),
+            )
+
+
+def bench(label: str, events: int, recipients: int) -> float:
+    start = time.process_time()
+    asyncio.run(_send_all(events, recipients))
+    elapsed = time.process_time() - start
+    per_message = elapsed / (events * recipients) * 1e6
+    print(f"{label}: {events * recipients} messages in {elapsed:.2f}s CPU = {per_message:.1f} µs/message")
+    return per_message
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--recipients", type=int, default=50)
+    args = parser.parse_args()
+
+    # Before: every recipient renders its own card
+    with mock.patch.object(notifier, "render_price_notification",
+                           notifier.render_price_notification.__wrapped__):
+        before = bench("render per recipient", args.events, args.recipients)
+    notifier.render_price_notification.cache_clear()
+    after = bench("render once per event", args.events, args.recipients)
+    print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
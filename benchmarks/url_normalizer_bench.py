@@ -0,0 +1,141 @@
+"""
+Check and time offline product-id extraction over a corpus of link shapes.
+
+Every (shape, expected site, expected id) row in CASES is crossed with the
+tracking-parameter suffixes in TRACKING, which gives a corpus of the link
+variants users paste (app shares, affiliate links, mobile and desktop
+hosts, deep links, short links). The corpus is checked against the
+expectations and normalize_product_url is timed over it; nothing touches
+the network.
+
+    python benchmarks/url_normalizer_bench.py --repeat 20
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.url_normalizer import normalize_product_url, is_short_link
+
+ASIN = "B0CHX1W1XY"
+ITM = "itm6ac6485515ae4"
+
+# (url, site, product id); site None = short link / not a product page
+CASES = [
+    # Amazon product shapes
+    (f"https://www.amazon.in/dp/{ASIN}", "amazon", ASIN),
+    (f"https://www.amazon.in/dp/{ASIN}/", "amazon", ASIN),
+    (f"https://www.amazon.in/Apple-iPhone-15-128-GB/dp/{ASIN}", "amazon", ASIN),
+    (f"https://www.amazon.in/Apple-iPhone-15-128-GB/dp/{ASIN}/ref=sr_1_1", "amazon", ASIN),
+    (f"https://amazon.in/gp/product/{ASIN}", "amazon", ASIN),
+    (f"https://www.amazon.in/gp/product/{ASIN}/ref=ppx_yo_dt_b_asin_title_o00_s00", "amazon", ASIN),
+    (f"https://m.amazon.in/gp/aw/d/{ASIN}", "amazon", ASIN),
+    (f"https://www.amazon.in/gp/offer-listing/{ASIN}", "amazon", ASIN),
+    (f"https://www.amazon.in/-/hi/dp/{ASIN}", "amazon", ASIN),
+    (f"https://www.amazon.com/exec/obidos/ASIN/{ASIN}", "amazon", ASIN),
+    (f"https://www.amazon.com/o/ASIN/{ASIN}", "amazon", ASIN),
+    (f"https://smile.amazon.com/dp/{ASIN}", "amazon", ASIN),
+    (f"https://www.amazon.co.uk/dp/{ASIN}", "amazon", ASIN),
+    (f"https://www.amazon.com.au/product/{ASIN}", "amazon", ASIN),
+    (f"https://www.amazon.in/dp/{ASIN.lower()}", "amazon", ASIN),
+    (f"https://www.amazon.in/gp/aw/d/{ASIN}?psc=1", "amazon", ASIN),
+    (f"http://www.amazon.in/dp/{ASIN}#customerReviews", "amazon", ASIN),
+    (f"https://www.amazon.in/portal/?asin={ASIN}", "amazon", ASIN),
+    (f"https://amzn.com/{ASIN}", "amazon", ASIN),
+    (f"https://www.amazon.in/dp/0143442295", "amazon", "0143442295"),
+    # Amazon pages that are not a product
+    ("https://www.amazon.in/s?k=iphone+15", None, None),
+    ("https://www.amazon.in/deals", None, None),
+    ("https://www.amazon.in/", None, None),
+    # Amazon short links
+    ("https://amzn.to/3XyZabc", None, None),
+    ("https://amzn.in/d/9Pq2kLm", None, None),
+    ("https://a.co/d/0abcdEf", None, None),
+    ("https://amzn.eu/d/5FgHiJk", None, None),
+    # Flipkart product shapes
+    (f"https://www.flipkart.com/apple-iphone-15-black-128-gb/p/{ITM}", "flipkart", ITM),
+    (f"https://www.flipkart.com/apple-iphone-15-black-128-gb/p/{ITM}?pid=MOBGTAGPTB3VS24W", "flipkart", ITM),
+    (f"https://flipkart.com/apple-iphone-15-black-128-gb/p/{ITM}", "flipkart", ITM),
+    (f"https://m.flipkart.com/apple-iphone-15-black-128-gb/p/{ITM}", "flipkart", ITM),
+    (f"https://dl.flipkart.com/dl/apple-iphone-15-black-128-gb/p/{ITM}?pid=MOBGTAGPTB3VS24W", "flipkart", ITM),
+    (f"https://www.flipkart.com/apple-iphone-15-black-128-gb/p/{ITM}/", "flipkart", ITM),
+    # Flipkart pages that are not a product
+    ("https://www.flipkart.com/search?q=iphone", None, None),
+    ("https://www.flipkart.com/mobiles/pr?sid=tyy,4io", None, None),
+    # Flipkart short links
+    ("https://fkrt.it/abcdEFgh", None, None),
+    ("https://fkrt.cc/xyz123", None, None),
+    ("https://dl.flipkart.com/s/abcDEF", None, None),
+    # Other sites
+    ("https://www.example.com/dp/B0CHX1W1XY", None, None),
+    ("ftp://www.amazon.in/dp/B0CHX1W1XY", None, None),
+]
+
+TRACKING = [
+    "",
+    "?tag=deals-21",
+    "?ref_=ast_sto_dp&th=1&psc=1",
+    "?utm_source=telegram&utm_medium=social&utm_campaign=sale",
+    "?pf_rd_r=ABC123&pf_rd_p=def456&pd_rd_w=xyz&pd_rd_wg=q1&pd_rd_r=r2",
+    "?keywords=iphone&qid=1700000000&sr=8-1&crid=XYZ&sprefix=ipho",
+    "?linkCode=sl1&tag=affil-21&linkId=abcdef&language=en_IN",
+    "?otracker=search&otracker1=search&fm=organic&iid=abc&ssid=def&qH=123",
+    "?affid=partner&affExtParam1=x&affExtParam2=y",
+    "?fbclid=IwAR0abc&gclid=Cj0KCQ",
+]
+
+
+def _with_tracking(url: str, suffix: str) -> str:
+    if not suffix:
+        return url
+    base, _, fragment = url.partition("#")
+    joined = base + ("&" + suffix[1:] if "?" in base else suffix)
+    return joined + ("#" + fragment if fragment else "")
+
+
+def corpus():
+    for url, site, product_id in CASES:
+        for suffix in TRACKING:
+            yield _with_tracking(url, suffix), site, product_id
+
+
+def check(urls) -> int:
+    failures = 0
+    for url, site, product_id in urls:
+        product = normalize_product_url(url)
+        got = (product.site, product.product_id) if product else (None, None)
+        if got != (site, product_id):
+            failures += 1
+            print(f"MISMATCH {url}: got {got}, expected {(site, product_id)}")
+    return failures
+
+
+def bench(label: str, func, urls, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for url in urls:
+            func(url)
+    elapsed = time.perf_counter() - start
+    n = len(urls) * repeat
+    print(f"{label}: {n} URLs in {elapsed:.3f}s = {elapsed / n * 1e6:.2f} µs/URL")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = list(corpus())
+    failures = check(rows)
+    short = sum(is_short_link(url) for url, _, _ in rows)
+    print(f"{len(rows)} URLs, {failures} mismatches, {short} short links need a redirect")
+
+    urls = [url for url, _, _ in rows]
+    bench("normalize_product_url", normalize_product_url, urls, args.repeat)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from dotenv import load_dotenv
 from models import Base
 
@@ -16,3 +18,32 @@ engine = create_engine(
 )
 Base.metadata.create_all(engine)
 Session = sessionmaker(bind=engine)
+
+
+def _async_url(url: str) -> str:
+    """The same database through an asyncio driver (asyncpg for Postgres)."""
+    url = make_url(url)
+    if url.drivername.startswith("postgresql"):
+        url = url.set(drivername="postgresql+asyncpg")
+    elif url.drivername.startswith("sqlite"):
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url.render_as_string(hide_password=False)
+
+
+# Async engine for the bot handlers, so a slow query never blocks the event
+# loop; the pool is sized for many concurrent updates rather than workers.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "20"))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "20"))
+ASYNC_DB_POOL_TIMEOUT = float(os.getenv("ASYNC_DB_POOL_TIMEOUT", "10"))
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_recycle=300,
+    pool_size=ASYNC_DB_POOL_SIZE,
+    max_overflow=ASYNC_DB_MAX_OVERFLOW,
+    pool_timeout=ASYNC_DB_POOL_TIMEOUT,
+)
+# expire_on_commit=False: handlers read attributes after commit without a lazy reload
+AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
@@ -0,0 +1,66 @@
+"""
+Shared dedup store for notification delivery.
+
+Records which (event_id, chat_id) pairs have already been sent so a
+redelivered Kafka message (after a crash or rebalance, before its offset
+was committed) is not sent twice. Marks live in Redis (the pooled client
+from redis_client.py), so every notification worker sees them, including
+the one that takes over a partition after a rebalance. Marks are buffered
+in memory and written in one pipeline per flush, and expire after
+DEDUP_TTL_HOURS. While Redis is unreachable, lookups answer "not sent"
+and marks stay buffered without waiting on it.
+"""
+
+import os
+import logging
+from redis.exceptions import RedisError
+from redis_client import get_redis, redis_available, mark_redis_down
+
+logger = logging.getLogger(__name__)
+
+DEDUP_TTL_HOURS = float(os.getenv("DEDUP_TTL_HOURS", "48"))
+
+
+def _key(event_id: str, chat_id: int) -> str:
+    return f"notified:{event_id}:{chat_id}"
+
+
+class DedupStore:
+    def __init__(self, ttl_hours: float = DEDUP_TTL_HOURS):
+        self.ttl = int(ttl_hours * 3600)
+        self._buffer: set[tuple[str, int]] = set()
+
+    async def seen(self, event_id: str, chat_id: int) -> bool:
+        if (event_id, chat_id) in self._buffer:
+            return True
+        if not redis_available():
+            return False
+        try:
+            return bool(await get_redis().exists(_key(event_id, chat_id)))
+        except (RedisError, OSError) as e:
+            # Unknown: send again rather than risk dropping the notification
+            mark_redis_down()
+            logger.warning("Dedup lookup failed, assuming not sent: %s", e)
+            return False
+
+    def add(self, event_id: str, chat_id: int):
+        self._buffer.add((event_id, chat_id))
+
+    async def flush(self):
+        """Persist buffered marks in one pipeline; kept for the next flush on failure."""
+        if not self._buffer or not redis_available():
+            return
+        marks = list(self._buffer)
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                for event_id, chat_id in marks:
+                    pipe.set(_key(event_id, chat_id), 1, ex=self.ttl)
+                await pipe.execute()
+        except (RedisError, OSError) as e:
+            mark_redis_down()
+            logger.warning("Dedup flush failed (will retry): %s", e)
+            return
+        self._buffer.difference_update(marks)
+
+    async def close(self):
+        await self.flush()
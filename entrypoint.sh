@@ -14,15 +14,19 @@ case "$ROLE" in
     exec python app.py
     ;;
   poller)
-    echo "Starting price poller..."
-    exec python poller.py
+    echo "Starting price poller (daemon mode)..."
+    exec python poller.py --daemon
+    ;;
+  fanout)
+    echo "Starting Kafka fan-out worker..."
+    exec python fanout_worker.py
     ;;
   notifier)
     echo "Starting Kafka notification worker..."
     exec python notification_worker.py
     ;;
   *)
-    echo "Unknown ROLE: $ROLE (expected: bot, poller, notifier)"
+    echo "Unknown ROLE: $ROLE (expected: bot, poller, fanout, notifier)"
     exit 1
     ;;
 esac
@@ -0,0 +1,99 @@
+"""
+Kafka fan-out stage: splits price-change events into per-recipient
+notifications.
+
+A price-change event carries every watcher's telegram id, so a product
+with 10k watchers is one huge message handled by a single consumer. This
+worker re-publishes it as one small message per chat on NOTIFY_TOPIC,
+keyed by chat id, so notification workers in the same consumer group
+share the load evenly (and each chat's messages stay in order on one
+partition).
+
+Offsets are committed manually, only once every notification fanned out
+from the consumed events has been acknowledged by Kafka; failed publishes
+are retried, and the worker stops without committing if they keep
+failing, so the events are consumed again after a restart.
+
+Run as a standalone process:
+    python fanout_worker.py
+"""
+
+import os
+import asyncio
+import logging
+from dotenv import load_dotenv
+from aiokafka.errors import CommitFailedError
+from kafka_queue import NOTIFY_TOPIC, FANOUT_GROUP, TOPIC, get_consumer, get_publisher
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Retries of failed notification publishes before the worker gives up (uncommitted)
+FANOUT_PUBLISH_RETRIES = int(os.getenv("FANOUT_PUBLISH_RETRIES", "5"))
+
+
+def fan_out(event: dict) -> list[dict]:
+    """One notification per recipient of a price-change event."""
+    base = {k: v for k, v in event.items() if k not in ("user_telegram_ids", "digest_windows")}
+    windows = event.get("digest_windows") or {}
+    return [
+        {**base, "chat_id": tid, "digest_window": windows.get(str(tid))}
+        for tid in event.get("user_telegram_ids", [])
+    ]
+
+
+async def _flush_with_retry(publisher):
+    """Flush the publisher, republishing failed notifications with backoff.
+
+    Raises RuntimeError if some are still failing after FANOUT_PUBLISH_RETRIES.
+    """
+    failures = await publisher.flush()
+    for attempt in range(FANOUT_PUBLISH_RETRIES):
+        if not failures:
+            return
+        delay = min(2 ** attempt, 30)
+        logger.warning("Retrying %d failed notification publishes in %ds", len(failures), delay)
+        await asyncio.sleep(delay)
+        for note, _ in failures:
+            await publisher.publish(note, key=note["chat_id"])
+        failures = await publisher.flush()
+    if failures:
+        raise RuntimeError(f"{len(failures)} notifications could not be published")
+
+
+async def run_fanout():
+    consumer = await get_consumer(TOPIC, FANOUT_GROUP, enable_auto_commit=False)
+    publisher = await get_publisher(NOTIFY_TOPIC)
+    logger.info("Fan-out worker started: %s → %s", TOPIC, NOTIFY_TOPIC)
+
+    try:
+        while True:
+            batches = await consumer.getmany(timeout_ms=1000, max_records=500)
+            if not batches:
+                continue
+            for records in batches.values():
+                for msg in records:
+                    for note in fan_out(msg.value):
+                        await publisher.publish(note, key=note["chat_id"])
+            # Commit the consumed events only once their notifications are in Kafka
+            await _flush_with_retry(publisher)
+            try:
+                await consumer.commit()
+            except CommitFailedError as e:
+                # Partitions moved; their events are fanned out again (deduplicated downstream)
+                logger.warning("Offset commit failed after rebalance: %s", e)
+    finally:
+        await consumer.stop()
+        await publisher.stop()
+
+
+def main():
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO,
+    )
+    asyncio.run(run_fanout())
+
+
+if __name__ == "__main__":
+    main()
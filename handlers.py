@@ -4,23 +4,61 @@ from datetime import datetime
 from urllib.parse import urlparse
 from telegram import Update
 from telegram.ext import ContextTypes
-from models import User, Product
-from notifier import send_price_card
-from utils.amazon import extract_amazon_price_and_name, extract_amazon_asin
-from utils.flipkart import extract_flipkart_price_and_name, extract_flipkart_pid
-from utils.scraper import scrapper, expand_url
-from db import Session  
-import aioredis
-import time
+from models import User, Product, user_tracked_products
+from notifier import send_price_card, DIGEST_DEFAULT_WINDOW
+from utils.ingest import ingest_url, is_supported_url, product_id_from_url
+from utils.price import Price
+from db import AsyncSession
+from sqlalchemy import select, delete, exists, func
+from sqlalchemy.orm import selectinload
+from rate_limiter import is_rate_limited, RATE_LIMIT_WINDOW
+from url_cache import lookup_product_id, remember_product_id
+from utils.url_normalizer import is_short_link, resolve_product_url
 import re
+import time
 import asyncio
 import urllib.parse
 
 logger = logging.getLogger(__name__)
 
-REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
-RATE_LIMIT = 10  # requests
-RATE_LIMIT_WINDOW = 60  # seconds
+
+async def _get_user(session, telegram_id, with_products=False):
+    """The User row for a Telegram id (optionally with tracked_products loaded), or None."""
+    query = select(User).filter_by(telegram_id=telegram_id)
+    if with_products:
+        query = query.options(selectinload(User.tracked_products))
+    return (await session.execute(query)).scalar_one_or_none()
+
+
+def _delete_orphans(product_ids):
+    """DELETE of the given products that no user tracks any more, as one statement."""
+    return (
+        delete(Product)
+        .where(Product.id.in_(product_ids))
+        .where(~exists().where(user_tracked_products.c.product_id == Product.id))
+        .execution_options(synchronize_session=False)
+    )
+
+
+# System-wide counters are the same for every user; count them at most once per TTL
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "60"))
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "20"))
+_system_counts_cache = (0.0, None)
+
+
+async def _system_counts(session):
+    """(total users, total products), cached for STATS_CACHE_TTL seconds."""
+    global _system_counts_cache
+    expires, counts = _system_counts_cache
+    if counts is None or time.monotonic() >= expires:
+        row = (await session.execute(select(
+            select(func.count()).select_from(User).scalar_subquery(),
+            select(func.count()).select_from(Product).scalar_subquery(),
+        ))).one()
+        counts = tuple(row)
+        _system_counts_cache = (time.monotonic() + STATS_CACHE_TTL, counts)
+    return counts
+
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command - show welcome message and instructions."""
@@ -38,9 +76,10 @@ I help you track prices for Amazon and Flipkart products and notify you when pri
 **Commands:**
 /start - Show this welcome message
 /help - Get detailed help
-/list - See your tracked products
+/list - See your tracked products (/list 2 for the next page)
 /stats - View your statistics
 /clear - Remove all tracked products
+/digest - Group price alerts into one message
 
 **Rate Limits:**
 You can track up to 10 products per minute.
@@ -68,9 +107,10 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 **Commands:**
 • `/start` - Welcome message
 • `/help` - This help text
-• `/list` - Your tracked products
+• `/list [page]` - Your tracked products
 • `/stats` - View your statistics
 • `/clear` - Remove all tracked products
+• `/digest <minutes>` - Collect price alerts for this long into one message (`/digest off` to get each alert immediately)
 
 **Features:**
 • Real-time price extraction
@@ -89,19 +129,38 @@ Need more help? Just mail to skshivamkumar382@gmail.com ! 💬
     await update.message.reply_text(help_text, parse_mode='Markdown')
 
 async def list_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /list command - show user's tracked products."""
+    """Handle /list command - show user's tracked products, LIST_PAGE_SIZE per page (/list <page>)."""
     telegram_id = update.effective_user.id
+    args = context.args or []
+    page = int(args[0]) if args and args[0].isdigit() and int(args[0]) > 0 else 1
     
-    session = Session()
+    session = AsyncSession()
     try:
-        user = session.query(User).filter_by(telegram_id=telegram_id).first()
-        if not user or not user.tracked_products:
-            await update.message.reply_text("📭 You're not tracking any products yet.\n\nSend me a product link to start tracking!")
+        # One joined query for the page, with the user's total via a window count
+        rows = (await session.execute(
+            select(
+                Product.product_name, Product.last_known_price, Product.product_url,
+                func.count().over().label("total"),
+            )
+            .join(user_tracked_products, user_tracked_products.c.product_id == Product.id)
+            .join(User, User.id == user_tracked_products.c.user_id)
+            .where(User.telegram_id == telegram_id)
+            .order_by(Product.id)
+            .limit(LIST_PAGE_SIZE)
+            .offset((page - 1) * LIST_PAGE_SIZE)
+        )).all()
+        if not rows:
+            if page > 1:
+                await update.message.reply_text(f"📭 There is no page {page}. Use /list to see your first page.")
+            else:
+                await update.message.reply_text("📭 You're not tracking any products yet.\n\nSend me a product link to start tracking!")
             return
         
-        products_text = f"📋 **Your Tracked Products** ({len(user.tracked_products)} items)\n\n"
+        total = rows[0].total
+        pages = (total + LIST_PAGE_SIZE - 1) // LIST_PAGE_SIZE
+        products_text = f"📋 **Your Tracked Products** ({total} items)\n\n"
         
-        for i, product in enumerate(user.tracked_products, 1):
+        for i, product in enumerate(rows, (page - 1) * LIST_PAGE_SIZE + 1):
             price_info = f"💰 {product.last_known_price}" if product.last_known_price else "❓ Price not available"
             product_name = product.product_name[:50] + "..." if product.product_name and len(product.product_name) > 50 else product.product_name or "Unknown Product"
             
@@ -109,6 +168,11 @@ async def list_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             products_text += f"   {price_info}\n"
             products_text += f"   🔗 [View Product]({product.product_url})\n\n"
         
+        if pages > 1:
+            products_text += f"Page {page} of {pages}."
+            if page < pages:
+                products_text += f" Send /list {page + 1} for more."
+            products_text += "\n\n"
         products_text += "To stop tracking a product, use the 'Stop Tracking' button on its product card."
         
         await update.message.reply_text(products_text, parse_mode='Markdown', disable_web_page_preview=True)
@@ -117,20 +181,22 @@ async def list_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"❌ Error in list command: {e}")
         await update.message.reply_text("❌ Sorry, I couldn't fetch your tracked products. Please try again later.")
     finally:
-        session.close()
-
-async def is_rate_limited(user_id):
-    redis = await aioredis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
-    key = f"rate_limit:{user_id}"
-    now = int(time.time())
-    await redis.zremrangebyscore(key, 0, now - RATE_LIMIT_WINDOW)
-    count = await redis.zcard(key)
-    limited = count >= RATE_LIMIT
-    if not limited:
-        await redis.zadd(key, {str(now): now})
-        await redis.expire(key, RATE_LIMIT_WINDOW)
-    await redis.close()
-    return limited, count
+        await session.close()
+
+async def _known_product(product_id):
+    """(product_id, product_url, price, product_name) of an already-tracked product
+    with a known price, or None."""
+    if not product_id:
+        return None
+    session = AsyncSession()
+    try:
+        product = (await session.execute(select(Product).filter_by(product_id=product_id))).scalar_one_or_none()
+        if product is None or product.last_known_price is None:
+            return None
+        price = Price.from_db(product.last_price_minor, product.price_currency, product.last_known_price)
+        return product.product_id, product.product_url, price, product.product_name
+    finally:
+        await session.close()
 
 # def save_html_for_debug(url: str, html: str):
 #     """Save HTML to debug file in logs folder"""
@@ -187,73 +253,78 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             await update.message.reply_text("❌ No valid URL found in the message. Please send a proper product link.")
             return
-
-        try:
-            loading_msg = await update.message.reply_text("🌐 Resolving short links if present...")
-            expanded_url = await asyncio.wait_for(expand_url(url_to_expand), timeout=12.0)
-            logger.info(f"Expanded URL: {expanded_url}")
-            await loading_msg.edit_text("📄 Loading product page...")
-            html, final_url = await asyncio.wait_for(scrapper(expanded_url), timeout=15.0)
-            logger.info(f"Fetched URL: {final_url}")
-            if not html:
-                await loading_msg.edit_text("❌ Failed to load the webpage. The site might be blocking requests or taking too long.")
-                return
-        except asyncio.TimeoutError:
-            logger.error(f"Timeout while processing URL {user_input}")
-            await loading_msg.edit_text("⏰ Request timed out. The website is taking too long to respond. Please try again later.")
-            return
-        except Exception as e:
-            logger.error(f"Error expanding/scraping URL {user_input}: {e}")
-            await loading_msg.edit_text("❌ Failed to access the webpage. Please check the URL and try again.")
+        if not is_supported_url(url_to_expand):
+            await update.message.reply_text("❌ Unsupported website. Please use Amazon or Flipkart product links.")
             return
 
-        domain = urlparse(final_url).netloc.replace("www.", "")
+        # Links resolved before are answered from the product's DB row, without a browser
         price = None
         product_id = None
         product_name = None
-
-        try:
-            if "amazon" in domain:
-                print("Detected Amazon URL")
-                await loading_msg.edit_text("🛒 Extracting Amazon product details...")
-                price, product_name = await extract_amazon_price_and_name(html)
-                product_id = await extract_amazon_asin(final_url)
-            elif "flipkart" in domain:
-                print("Detected Flipkart URL")
-                await loading_msg.edit_text("🛍️ Extracting Flipkart product details...")
-                price, product_name = await extract_flipkart_price_and_name(html)
-                product_id = await extract_flipkart_pid(final_url)
-            else:
+        url_to_fetch = url_to_expand
+        link_product_id = await lookup_product_id(url_to_expand) or product_id_from_url(url_to_expand)
+        if link_product_id is None and is_short_link(url_to_expand):
+            # Follow the short link's redirect with a plain HEAD/GET, not a page load
+            product = await resolve_product_url(url_to_expand)
+            if product is not None:
+                link_product_id, url_to_fetch = product.product_id, product.url
+        known = await _known_product(link_product_id)
+        if known is not None:
+            loading_msg = await update.message.reply_text("🔎 Looking up product...")
+            product_id, final_url, price, product_name = known
+            logger.info(f"Answered {product_id} from the database without loading the page")
+        else:
+            # One fetch follows short links and yields final URL, price, name and product id
+            try:
+                loading_msg = await update.message.reply_text("📄 Loading product page...")
+                result = await asyncio.wait_for(ingest_url(url_to_fetch), timeout=15.0)
+                logger.info(f"Fetched URL: {result.final_url}")
+            except asyncio.TimeoutError:
+                logger.error(f"Timeout while processing URL {user_input}")
+                await loading_msg.edit_text("⏰ Request timed out. The website is taking too long to respond. Please try again later.")
+                return
+            except Exception as e:
+                logger.error(f"Error fetching/extracting URL {user_input}: {e}")
+                await loading_msg.edit_text("❌ Failed to access the webpage. Please check the URL and try again.")
+                return
+            if result.final_url is None:
+                await loading_msg.edit_text("❌ Failed to load the webpage. The site might be blocking requests or taking too long.")
+                return
+            if result.site is None:
                 await loading_msg.edit_text("❌ Unsupported website. Please use Amazon or Flipkart product links.")
                 return
-        except Exception as e:
-            logger.error(f"Error extracting price/product info: {e}")
-            await loading_msg.edit_text("❌ Failed to extract product information. Please try again later.")
-            return
+            final_url, price, product_name, product_id = (
+                result.final_url, result.price, result.product_name, result.product_id
+            )
+
+        if product_id:
+            await remember_product_id(product_id, url_to_expand, final_url)
 
         # --- Store user and product in DB ---
         try:
             await loading_msg.edit_text("💾 Saving to database...")
-            session = Session()
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
+            session = AsyncSession()
+            user = await _get_user(session, telegram_id, with_products=True)
             if not user:
-                user = User(telegram_id=telegram_id, username=username)
+                user = User(telegram_id=telegram_id, username=username, tracked_products=[])
                 session.add(user)
-                session.commit()
+                await session.commit()
             if not product_id:
                 await loading_msg.edit_text("❌ Could not extract a valid product ID from the link. Please check the URL.")
                 return
             # Check if product exists, else create
-            product = session.query(Product).filter_by(product_id=product_id).first()
+            product = (await session.execute(select(Product).filter_by(product_id=product_id))).scalar_one_or_none()
             if not product:
                 product = Product(
                     product_id=product_id,
                     product_url=final_url,
-                    last_known_price=price,
+                    last_known_price=str(price) if price is not None else None,
+                    last_price_minor=price.minor_units if price is not None else None,
+                    price_currency=price.currency if price is not None else None,
                     product_name=product_name
                 )
                 session.add(product)
-                session.commit()
+                await session.commit()
             
             # Check if user is already tracking this product
             if product in user.tracked_products:
@@ -270,15 +341,15 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return
             else:
                 user.tracked_products.append(product)
-                session.commit()
+                await session.commit()
                 logger.info(f"✅ Saved to DB: User {telegram_id}, Price {price}, Product ID {product_id}")
         except Exception as db_error:
             logger.error(f"Database error for user {telegram_id}: {db_error}")
-            session.rollback()
+            await session.rollback()
             await loading_msg.edit_text("❌ Database error. Please try again later.")
             return
         finally:
-            session.close()
+            await session.close()
         # --- End DB logic ---
 
         if price is not None:
@@ -312,19 +383,24 @@ async def stop_tracking_callback(update: Update, context: ContextTypes.DEFAULT_T
     data = query.data
     if data.startswith("stop_"):
         product_id = data.replace("stop_", "")
-        session = Session()
+        session = AsyncSession()
 
         logger.info(f"Stop tracking request: product_id={product_id}, user_id={user_id}")
         try:
-            user = session.query(User).filter_by(telegram_id=user_id).first()
-            product = session.query(Product).filter_by(product_id=product_id).first()
-            if user and product and product in user.tracked_products:
-                user.tracked_products.remove(product)
-                session.commit()
+            user = await _get_user(session, user_id)
+            product = (await session.execute(select(Product).filter_by(product_id=product_id))).scalar_one_or_none()
+            removed = 0
+            if user and product:
+                removed = (await session.execute(
+                    delete(user_tracked_products)
+                    .where(user_tracked_products.c.user_id == user.id)
+                    .where(user_tracked_products.c.product_id == product.id)
+                )).rowcount
+                await session.commit()
+            if removed:
                 # Clean up: If no users are tracking this product, delete the product
-                if not product.users:
-                    session.delete(product)
-                    session.commit()
+                if (await session.execute(_delete_orphans([product.id]))).rowcount:
+                    await session.commit()
                     logger.info(f"Cleaned up unused product: {product_id}")
                 await query.edit_message_text("🛑 Tracking stopped for this product.")
                 logger.info(f"Tracking stopped for product {product_id} by user {user_id}")
@@ -334,30 +410,29 @@ async def stop_tracking_callback(update: Update, context: ContextTypes.DEFAULT_T
         except Exception as e:
             logger.error(f"Error stopping tracking for user {user_id}, product {product_id}: {e}")
             await query.edit_message_text("❌ Failed to stop tracking due to an error.")
-            session.rollback()
+            await session.rollback()
         finally:
-            session.close()
+            await session.close()
 
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /stats command - show user statistics and system info."""
     telegram_id = update.effective_user.id
     
-    session = Session()
+    session = AsyncSession()
     try:
-        # Get user stats
-        user = session.query(User).filter_by(telegram_id=telegram_id).first()
-        user_product_count = len(user.tracked_products) if user else 0
+        # Get user stats: both counts in one aggregate over the user's products
+        user = await _get_user(session, telegram_id)
+        user_product_count = products_with_prices = 0
+        if user:
+            user_product_count, products_with_prices = (await session.execute(
+                select(func.count(), func.count(Product.last_known_price))
+                .select_from(user_tracked_products)
+                .join(Product, Product.id == user_tracked_products.c.product_id)
+                .where(user_tracked_products.c.user_id == user.id)
+            )).one()
         
         # Get system stats
-        total_products = session.query(Product).count()
-        total_users = session.query(User).count()
-        
-        # Calculate user's products with valid prices
-        products_with_prices = 0
-        if user:
-            for product in user.tracked_products:
-                if product.last_known_price:
-                    products_with_prices += 1
+        total_users, total_products = await _system_counts(session)
         
         stats_text = f"""
 📊 **Your Statistics**
@@ -382,35 +457,29 @@ Use /list to see your tracked products or /help for more info!
         logger.error(f"❌ Error in stats command: {e}")
         await update.message.reply_text("❌ Sorry, I couldn't fetch statistics. Please try again later.")
     finally:
-        session.close()
+        await session.close()
 
 async def clear_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /clear command - remove all tracked products for user."""
     telegram_id = update.effective_user.id
     
-    session = Session()
+    session = AsyncSession()
     try:
-        user = session.query(User).filter_by(telegram_id=telegram_id).first()
-        if not user or not user.tracked_products:
+        # Remove all tracked products for this user, then delete the ones nobody
+        # else tracks, in one transaction of two statements
+        user_id = select(User.id).where(User.telegram_id == telegram_id).scalar_subquery()
+        product_ids = (await session.execute(
+            delete(user_tracked_products)
+            .where(user_tracked_products.c.user_id == user_id)
+            .returning(user_tracked_products.c.product_id)
+        )).scalars().all()
+        if not product_ids:
             await update.message.reply_text("📭 You don't have any products to clear!")
             return
         
-        product_count = len(user.tracked_products)
-        
-        # Remove all tracked products for this user
-        products_to_check = list(user.tracked_products)
-        user.tracked_products.clear()
-        session.commit()
-        
-        # Clean up: Delete products that no longer have any users
-        cleaned_products = 0
-        for product in products_to_check:
-            session.refresh(product)  # Refresh to get updated relationships
-            if not product.users:
-                session.delete(product)
-                cleaned_products += 1
-        
-        session.commit()
+        product_count = len(product_ids)
+        cleaned_products = (await session.execute(_delete_orphans(product_ids))).rowcount
+        await session.commit()
         
         clear_text = f"""
 🗑️ **Products Cleared Successfully!**
@@ -427,7 +496,56 @@ Use /help if you need assistance!
         
     except Exception as e:
         logger.error(f"❌ Error in clear command: {e}")
-        session.rollback()
+        await session.rollback()
         await update.message.reply_text("❌ Sorry, I couldn't clear your products. Please try again later.")
     finally:
-        session.close()
\ No newline at end of file
+        await session.close()
+
+def _describe_digest_window(window):
+    return "off" if window == 0 else f"{window // 60} minute(s)"
+
+
+async def digest_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /digest command - set how long price alerts are collected into one message."""
+    telegram_id = update.effective_user.id
+    args = context.args or []
+
+    session = AsyncSession()
+    try:
+        user = await _get_user(session, telegram_id)
+        if not args:
+            window = user.digest_window if user and user.digest_window is not None else None
+            if window is None:
+                current = f"default ({_describe_digest_window(DIGEST_DEFAULT_WINDOW)})"
+            else:
+                current = _describe_digest_window(window)
+            await update.message.reply_text(
+                f"⏱ Price alert digest: {current}.\n\n"
+                "Use /digest <minutes> to group alerts, or /digest off to get each alert immediately."
+            )
+            return
+
+        arg = args[0].lower()
+        if arg in ("off", "0"):
+            window = 0
+        elif arg.isdigit() and 0 < int(arg) <= 24 * 60:
+            window = int(arg) * 60
+        else:
+            await update.message.reply_text("❌ Please send a number of minutes (1-1440) or 'off'.")
+            return
+
+        if not user:
+            user = User(telegram_id=telegram_id, username=update.effective_user.username)
+            session.add(user)
+        user.digest_window = window
+        await session.commit()
+        if window:
+            await update.message.reply_text(f"✅ Price alerts will be grouped into one message every {window // 60} minute(s).")
+        else:
+            await update.message.reply_text("✅ You'll get each price alert immediately.")
+    except Exception as e:
+        logger.error(f"❌ Error in digest command: {e}")
+        await session.rollback()
+        await update.message.reply_text("❌ Sorry, I couldn't update your digest setting. Please try again later.")
+    finally:
+        await session.close()
@@ -2,7 +2,9 @@
 Kafka-based message queue for decoupling price polling from notifications.
 
 The poller produces price-change events to a Kafka topic.
-The notification worker consumes them and sends Telegram messages.
+The fan-out worker splits each event into one message per recipient on
+the notifications topic, keyed by chat id, and any number of notification
+workers in one consumer group share those and send Telegram messages.
 
 Benefits over plain polling+notify in one loop:
 - Poller and notifier scale independently
@@ -12,7 +14,9 @@ Benefits over plain polling+notify in one loop:
 """
 
 import os
+import time
 import json
+import asyncio
 import logging
 from aiokafka import AIOKafkaProducer, AIOKafkaConsumer
 from dotenv import load_dotenv
@@ -23,34 +27,133 @@ logger = logging.getLogger(__name__)
 KAFKA_BOOTSTRAP = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
 TOPIC = os.getenv("KAFKA_TOPIC", "price_changes")
 CONSUMER_GROUP = os.getenv("KAFKA_CONSUMER_GROUP", "notifier-group")
+# Per-recipient notifications produced by the fan-out stage, keyed by chat id
+NOTIFY_TOPIC = os.getenv("KAFKA_NOTIFY_TOPIC", "price_notifications")
+FANOUT_GROUP = os.getenv("KAFKA_FANOUT_GROUP", "fanout-group")
+
+# Producer tuning: let events accumulate briefly into compressed batches
+KAFKA_LINGER_MS = int(os.getenv("KAFKA_LINGER_MS", "20"))
+KAFKA_MAX_BATCH_BYTES = int(os.getenv("KAFKA_MAX_BATCH_BYTES", str(256 * 1024)))
+KAFKA_COMPRESSION = os.getenv("KAFKA_COMPRESSION", "gzip") or None  # gzip|snappy|lz4|zstd|""
+KAFKA_IDEMPOTENT = os.getenv("KAFKA_IDEMPOTENT", "1") == "1"
+
+_json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def _serialize(value) -> bytes:
+    return _json_encoder.encode(value).encode("utf-8")
+
 
 async def get_producer() -> AIOKafkaProducer:
     producer = AIOKafkaProducer(
         bootstrap_servers=KAFKA_BOOTSTRAP,
-        value_serializer=lambda v: json.dumps(v).encode("utf-8"),
+        value_serializer=_serialize,
+        key_serializer=lambda k: str(k).encode("utf-8"),
+        linger_ms=KAFKA_LINGER_MS,
+        max_batch_size=KAFKA_MAX_BATCH_BYTES,
+        compression_type=KAFKA_COMPRESSION,
+        enable_idempotence=KAFKA_IDEMPOTENT,
+        acks="all",
     )
     await producer.start()
     return producer
 
 
-async def publish_price_change(producer: AIOKafkaProducer, event: dict):
-    """Publish a price-change event to Kafka.
+class PriceEventPublisher:
+    """Fire-and-forget publishing of price-change events (or, with
+    ``topic=NOTIFY_TOPIC``, per-recipient notifications).
 
-    event keys: product_id, product_url, product_name,
-                old_price, new_price, user_telegram_ids
+    ``publish`` only appends the event to the producer's batch (waiting
+    solely when the local buffer is full); delivery results are collected
+    in the background and reported together by ``flush``, which also logs
+    the sustained events/sec since the previous flush.
     """
-    await producer.send_and_wait(TOPIC, value=event)
-    logger.info("Published price change for product %s", event.get("product_id"))
 
+    def __init__(self, producer: AIOKafkaProducer, topic: str = TOPIC):
+        self.producer = producer
+        self.topic = topic
+        self._pending: set[asyncio.Future] = set()
+        self._published = 0
+        self._failures: list[tuple[dict, BaseException]] = []
+        self._window_start: float | None = None
+
+    async def publish(self, event: dict, key=None):
+        """Queue an event. Keyed by product unless ``key`` is given, so
+        per-product (or per-chat) order is kept.
+
+        price-change event keys: event_id, product_id, product_url, product_name,
+                    old_price, new_price (display strings),
+                    old_price_minor, new_price_minor, currency (numeric form),
+                    user_telegram_ids, digest_windows ({str(chat id): seconds})
+        """
+        if self._window_start is None:
+            self._window_start = time.monotonic()
+        try:
+            fut = await self.producer.send(
+                self.topic, value=event, key=key if key is not None else event.get("product_id")
+            )
+        except Exception as e:
+            self._failures.append((event, e))
+            return
+        self._published += 1
+        self._pending.add(fut)
+        fut.add_done_callback(lambda f, event=event: self._on_delivery(f, event))
+
+    def _on_delivery(self, fut: asyncio.Future, event: dict):
+        self._pending.discard(fut)
+        if not fut.cancelled() and fut.exception() is not None:
+            self._failures.append((event, fut.exception()))
 
-async def get_consumer() -> AIOKafkaConsumer:
+    async def flush(self) -> list[tuple[dict, BaseException]]:
+        """Send everything buffered, wait for all deliveries and report failures.
+
+        Returns the (event, error) pairs that failed since the last flush.
+        """
+        await self.producer.flush()
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        failures, self._failures = self._failures, []
+        if self._published:
+            elapsed = time.monotonic() - (self._window_start or time.monotonic())
+            logger.info(
+                "Published %d events to %s in %.2fs (%.0f events/s), %d failed",
+                self._published, self.topic, elapsed, self._published / max(elapsed, 1e-6), len(failures),
+            )
+        for event, error in failures:
+            logger.error("Failed to publish event for product %s: %s",
+                         event.get("product_id"), error)
+        self._published = 0
+        self._window_start = None
+        return failures
+
+    async def stop(self):
+        """Flush pending events, then stop the underlying producer."""
+        try:
+            await self.flush()
+        finally:
+            await self.producer.stop()
+
+
+async def get_publisher(topic: str = TOPIC) -> PriceEventPublisher:
+    return PriceEventPublisher(await get_producer(), topic)
+
+
+async def get_consumer(topic: str = TOPIC, group_id: str = CONSUMER_GROUP,
+                       enable_auto_commit: bool = True, listener=None) -> AIOKafkaConsumer:
+    """Start a consumer on ``topic``.
+
+    With ``enable_auto_commit=False`` the caller commits offsets itself;
+    ``listener`` (a ConsumerRebalanceListener) lets it commit on revocation.
+    """
     consumer = AIOKafkaConsumer(
-        TOPIC,
+        *([] if listener else [topic]),
         bootstrap_servers=KAFKA_BOOTSTRAP,
-        group_id=CONSUMER_GROUP,
+        group_id=group_id,
         value_deserializer=lambda v: json.loads(v.decode("utf-8")),
         auto_offset_reset="earliest",
-        enable_auto_commit=True,
+        enable_auto_commit=enable_auto_commit,
     )
+    if listener:
+        consumer.subscribe([topic], listener=listener)
     await consumer.start()
     return consumer
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, BigInteger, String, DateTime, UniqueConstraint, Table, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, UniqueConstraint, Table, ForeignKey, Index
 from sqlalchemy.orm import declarative_base, object_session, relationship
 from datetime import datetime
 
@@ -17,6 +17,7 @@ class User(Base):
     telegram_id = Column(BigInteger, unique=True, nullable=False)
     username = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
+    digest_window = Column(Integer)  # seconds to collect price alerts into one message; NULL = default, 0 = off
     tracked_products = relationship(
         'Product',
         secondary=user_tracked_products,
@@ -28,12 +29,34 @@ class Product(Base):
     id = Column(Integer, primary_key=True)
     product_id = Column(String, unique=True, nullable=False)  # ASIN or Flipkart product ID
     product_url = Column(String, nullable=False)
-    last_known_price = Column(String)
+    last_known_price = Column(String)  # display form, e.g. "₹1,299"
+    last_price_minor = Column(BigInteger)  # same price in minor units (paise)
+    price_currency = Column(String(3))
     last_checked = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
     product_name = Column(String)  
+    # Adaptive poll scheduling (see scheduler.py)
+    check_interval = Column(Integer)  # seconds
+    next_check_at = Column(DateTime, index=True)
+    last_changed_at = Column(DateTime)
     users = relationship(
         'User',
         secondary=user_tracked_products,
         back_populates='tracked_products'
     )
+
+class PriceHistory(Base):
+    """Append-only price observations, one row per successful check.
+
+    Prices are stored as integer minor units (paise) to keep rows small and
+    comparisons exact; old points are downsampled by price_history.prune_history().
+    """
+    __tablename__ = 'price_history'
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    observed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    price_minor_units = Column(BigInteger, nullable=False)
+    __table_args__ = (
+        # Serves "last N points for product X" as a backward index scan
+        Index('ix_price_history_product_observed', 'product_id', 'observed_at'),
+    )
@@ -1,5 +1,14 @@
 """
-Kafka consumer that reads price-change events and sends Telegram notifications.
+Kafka consumer that reads per-recipient notifications (produced by
+fanout_worker.py, keyed by chat id) and sends Telegram messages. Run as
+many workers in the consumer group as needed; partitions are shared.
+
+Delivery is at-least-once with manual offset commits (only for messages
+whose send finished) plus a shared dedup store keyed by (event_id,
+chat_id), so a redelivered message is not sent twice. When partitions are
+revoked, their open digest windows are closed early and their pending
+sends are awaited before the final commit, so the next owner does not
+repeat them.
 
 Run as a standalone process:
     python notification_worker.py
@@ -10,36 +19,286 @@ import asyncio
 import logging
 from dotenv import load_dotenv
 from telegram import Bot
-from kafka_queue import get_consumer
-from notifier import send_price_notification_card
+from aiokafka import TopicPartition
+from aiokafka.abc import ConsumerRebalanceListener
+from kafka_queue import NOTIFY_TOPIC, CONSUMER_GROUP, get_consumer
+from fanout_worker import fan_out
+from notifier import send_price_notification_card, send_price_digest_card, DIGEST_DEFAULT_WINDOW
+from utils.price import Price
+from telegram_sender import TelegramSender
+from dedup_store import DedupStore
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
+# Offsets are committed manually, in batches, only after their sends finish
+NOTIFIER_COMMIT_INTERVAL = float(os.getenv("NOTIFIER_COMMIT_INTERVAL", "2"))
+# Longest a rebalance waits for pending sends of revoked partitions (seconds)
+NOTIFIER_REVOKE_TIMEOUT = float(os.getenv("NOTIFIER_REVOKE_TIMEOUT", "30"))
+# Most products listed in one digest message
+DIGEST_MAX_ITEMS = int(os.getenv("DIGEST_MAX_ITEMS", "10"))
+
+
+def event_prices(event: dict):
+    """(new, old) Price from an event's numeric fields, or its strings for older events."""
+    if event.get("new_price_minor") is not None:
+        currency = event.get("currency")
+        old_minor = event.get("old_price_minor")
+        return (
+            Price(event["new_price_minor"], currency),
+            Price(old_minor, currency) if old_minor is not None else None,
+        )
+    return Price.parse(event.get("new_price")), Price.parse(event.get("old_price"))
+
+
+def _notification_sender(bot, note: dict):
+    """Coroutine function that sends the card for one notification."""
+    new_price, old_price = event_prices(note)
+    return lambda: send_price_notification_card(
+        bot=bot,
+        chat_id=note["chat_id"],
+        product_url=note["product_url"],
+        price=new_price,
+        product_id=note["product_id"],
+        product_name=note.get("product_name"),
+        old_price=old_price,
+    )
+
+
+def _log_delivery(tid, fut: asyncio.Future):
+    if fut.cancelled():
+        return
+    if fut.exception() is not None:
+        logger.error("Failed to notify user %s: %s", tid, fut.exception())
+    else:
+        logger.info("Notified user %s", tid)
+
+
+async def handle_notification(bot, note: dict, sender: TelegramSender | None = None):
+    """Send one per-recipient notification (a fanned-out price-change event).
+
+    With a ``sender`` the message is queued on the rate-limited concurrent
+    sender and the delivery future is returned; otherwise it is sent inline.
+    """
+    tid = note["chat_id"]
+    send = _notification_sender(bot, note)
+    if sender is not None:
+        fut = await sender.submit(tid, send)
+        fut.add_done_callback(lambda f: _log_delivery(tid, f))
+        return fut
+    try:
+        await send()
+        logger.info("Notified user %s", tid)
+    except Exception as e:
+        logger.error("Failed to notify user %s: %s", tid, e)
 
 
-async def handle_event(bot, event: dict):
-    """Send Telegram notifications for a single price-change event."""
-    user_ids = event.get("user_telegram_ids", [])
+async def handle_event(bot, event: dict, sender: TelegramSender | None = None):
+    """Send Telegram notifications for a whole price-change event (all recipients)."""
+    notes = fan_out(event)
     logger.info(
-        "Notifying %d users about %s", len(user_ids), event.get("product_id")
+        "Notifying %d users about %s", len(notes), event.get("product_id")
     )
+    if sender is None:
+        for note in notes:
+            await handle_notification(bot, note)
+        return
+    futures = [await handle_notification(bot, note, sender) for note in notes]
+    await asyncio.gather(*futures, return_exceptions=True)
 
-    for tid in user_ids:
-        try:
-            await send_price_notification_card(
-                bot=bot,
-                chat_id=tid,
-                product_url=event["product_url"],
-                price=event["new_price"],
-                product_id=event["product_id"],
-                product_name=event.get("product_name"),
-                old_price=event.get("old_price"),
+
+class DigestCoalescer:
+    """Merge notifications for the same chat that arrive within its digest window.
+
+    The first notification for a chat opens a window (the user's
+    digest_window, or DIGEST_DEFAULT_WINDOW, which is off unless
+    configured); everything that arrives for
+    that chat before it closes goes out as one digest message (a single
+    notification is sent as the usual card). Repeated changes of the same
+    product collapse into one line: first old price → latest new price.
+    ``add`` returns a future resolved when the message carrying the
+    notification has been delivered.
+    """
+
+    def __init__(self, bot, sender: TelegramSender,
+                 default_window: int = DIGEST_DEFAULT_WINDOW, max_items: int = DIGEST_MAX_ITEMS):
+        self.bot = bot
+        self.sender = sender
+        self.default_window = default_window
+        self.max_items = max_items
+        self._open: dict[int, list[tuple[dict, asyncio.Future]]] = {}
+        self._timers: dict[int, asyncio.TimerHandle] = {}
+
+    async def add(self, note: dict) -> asyncio.Future:
+        window = note.get("digest_window")
+        window = self.default_window if window is None else window
+        if window <= 0:
+            return await handle_notification(self.bot, note, self.sender)
+
+        chat_id = note["chat_id"]
+        fut = asyncio.get_running_loop().create_future()
+        self._open.setdefault(chat_id, []).append((note, fut))
+        if chat_id not in self._timers:
+            self._timers[chat_id] = asyncio.get_running_loop().call_later(
+                window, lambda: asyncio.ensure_future(self._close(chat_id))
             )
-            logger.info("Notified user %s", tid)
+        return fut
+
+    async def flush(self):
+        """Close every open window now (shutdown)."""
+        for chat_id in list(self._timers):
+            self._timers[chat_id].cancel()
+            await self._close(chat_id)
+
+    def close_windows_for(self, futures):
+        """Close now the open windows holding any of ``futures`` (revoked partitions)."""
+        wanted = set(futures)
+        for chat_id, entries in list(self._open.items()):
+            if any(fut in wanted for _, fut in entries):
+                self._timers[chat_id].cancel()
+                asyncio.ensure_future(self._close(chat_id))
+
+    async def _close(self, chat_id: int):
+        self._timers.pop(chat_id, None)
+        entries = self._open.pop(chat_id, [])
+        if not entries:
+            return
+
+        # One line per product: first old price, latest everything else
+        merged: dict[str, dict] = {}
+        for note, _ in entries:
+            first = merged.get(note["product_id"])
+            merged[note["product_id"]] = {**note, "old_price_minor": first.get("old_price_minor"),
+                                          "old_price": first.get("old_price")} if first else note
+        notes = list(merged.values())
+
+        futures = [fut for _, fut in entries]
+        try:
+            if len(notes) == 1:
+                sent = [await handle_notification(self.bot, notes[0], self.sender)]
+            else:
+                sent = []
+                for start in range(0, len(notes), self.max_items):
+                    items = []
+                    for note in notes[start:start + self.max_items]:
+                        new_price, old_price = event_prices(note)
+                        items.append({**note, "price": new_price, "old_price": old_price})
+                    send = lambda items=items: send_price_digest_card(self.bot, chat_id, items)
+                    sent.append(await self.sender.submit(chat_id, send))
+                logger.info("Coalesced %d alerts into %d digest(s) for %s", len(entries), len(sent), chat_id)
+            results = await asyncio.gather(*sent, return_exceptions=True)
+            error = next((r for r in results if isinstance(r, BaseException)), None)
         except Exception as e:
-            logger.error("Failed to notify user %s: %s", tid, e)
+            error = e
+        for fut in futures:
+            if fut.done():
+                continue
+            if error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(None)
+
+
+class OffsetTracker:
+    """Per partition, the offset below which every message has finished sending.
+
+    Messages complete out of order (the sender is concurrent), so the
+    committable offset is the lowest still-pending one, or one past the
+    last seen offset when nothing is pending.
+    """
+
+    def __init__(self):
+        self._pending: dict[TopicPartition, dict[int, asyncio.Future | None]] = {}
+        self._next: dict[TopicPartition, int] = {}
+
+    def started(self, tp: TopicPartition, offset: int):
+        self._pending.setdefault(tp, {})[offset] = None
+        self._next[tp] = max(self._next.get(tp, 0), offset + 1)
+
+    def attach(self, tp: TopicPartition, offset: int, fut: asyncio.Future):
+        """Record the delivery future of a pending message."""
+        if offset in self._pending.get(tp, {}):
+            self._pending[tp][offset] = fut
+
+    def done(self, tp: TopicPartition, offset: int):
+        if tp in self._pending:
+            self._pending[tp].pop(offset, None)
+
+    def futures(self, partitions) -> list[asyncio.Future]:
+        """Delivery futures still pending on ``partitions``."""
+        return [
+            fut for tp in partitions
+            for fut in self._pending.get(tp, {}).values() if fut is not None and not fut.done()
+        ]
+
+    def committable(self, partitions=None) -> dict[TopicPartition, int]:
+        partitions = self._next.keys() if partitions is None else partitions
+        return {
+            tp: min(self._pending[tp]) if self._pending.get(tp) else self._next[tp]
+            for tp in partitions if tp in self._next
+        }
+
+    def forget(self, partitions):
+        for tp in partitions:
+            self._pending.pop(tp, None)
+            self._next.pop(tp, None)
+
+
+class _CommitOnRevoke(ConsumerRebalanceListener):
+    """Finish and commit work for partitions that are about to move to another worker.
+
+    Open digest windows holding their notifications are closed now and the
+    pending sends awaited (up to NOTIFIER_REVOKE_TIMEOUT), then the dedup
+    marks are written and the finished offsets committed.
+    """
+
+    def __init__(self, tracker: OffsetTracker, dedup: DedupStore):
+        self.tracker = tracker
+        self.dedup = dedup
+        self.consumer = None
+        self.coalescer = None
+
+    async def on_partitions_revoked(self, revoked):
+        pending = self.tracker.futures(revoked)
+        if pending:
+            if self.coalescer is not None:
+                self.coalescer.close_windows_for(pending)
+            _, unfinished = await asyncio.wait(pending, timeout=NOTIFIER_REVOKE_TIMEOUT)
+            if unfinished:
+                logger.warning("%d notifications of revoked partitions still sending; "
+                               "the next owner may repeat them", len(unfinished))
+        await self.dedup.flush()
+        offsets = self.tracker.committable(revoked)
+        if offsets and self.consumer is not None:
+            try:
+                await self.consumer.commit(offsets)
+            except Exception as e:
+                logger.warning("Offset commit on revoke failed: %s", e)
+        self.tracker.forget(revoked)
+
+    async def on_partitions_assigned(self, assigned):
+        pass
+
+
+async def _commit_periodically(consumer, tracker: OffsetTracker, dedup: DedupStore):
+    """Every NOTIFIER_COMMIT_INTERVAL: persist dedup marks, then commit finished offsets."""
+    last_committed: dict = {}
+    while True:
+        await asyncio.sleep(NOTIFIER_COMMIT_INTERVAL)
+        await _commit(consumer, tracker, dedup, last_committed)
+
+
+async def _commit(consumer, tracker: OffsetTracker, dedup: DedupStore, last_committed: dict):
+    await dedup.flush()
+    offsets = {tp: o for tp, o in tracker.committable().items() if last_committed.get(tp) != o}
+    if not offsets:
+        return
+    try:
+        await consumer.commit(offsets)
+        last_committed.update(offsets)
+    except Exception as e:
+        logger.warning("Offset commit failed (will retry): %s", e)
 
 
 async def run_consumer():
@@ -48,15 +307,47 @@ async def run_consumer():
         return
 
     bot = Bot(token=BOT_TOKEN)
-    consumer = await get_consumer()
-    logger.info("Notification worker started, listening for price changes…")
+    sender = TelegramSender()
+    await sender.start()
+    tracker = OffsetTracker()
+    dedup = DedupStore()
+    listener = _CommitOnRevoke(tracker, dedup)
+    consumer = await get_consumer(NOTIFY_TOPIC, CONSUMER_GROUP,
+                                  enable_auto_commit=False, listener=listener)
+    listener.consumer = consumer
+    coalescer = DigestCoalescer(bot, sender)
+    listener.coalescer = coalescer
+    committer = asyncio.create_task(_commit_periodically(consumer, tracker, dedup))
+    logger.info("Notification worker started, listening for notifications…")
+
+    def on_sent(fut, tp, offset, event_id, chat_id):
+        # Permanently failed sends are committed too; the sender already retried them
+        if event_id and not fut.cancelled() and fut.exception() is None:
+            dedup.add(event_id, chat_id)
+        tracker.done(tp, offset)
 
     try:
         async for msg in consumer:
-            event = msg.value
-            await handle_event(bot, event)
+            tp = TopicPartition(msg.topic, msg.partition)
+            note = msg.value
+            event_id, chat_id = note.get("event_id"), note["chat_id"]
+            tracker.started(tp, msg.offset)
+            if event_id and await dedup.seen(event_id, chat_id):
+                logger.info("Skipping already-sent notification %s for %s", event_id, chat_id)
+                tracker.done(tp, msg.offset)
+                continue
+            fut = await coalescer.add(note)
+            tracker.attach(tp, msg.offset, fut)
+            fut.add_done_callback(
+                lambda f, tp=tp, offset=msg.offset, e=event_id, c=chat_id: on_sent(f, tp, offset, e, c)
+            )
     finally:
+        committer.cancel()
+        await coalescer.flush()
+        await sender.stop()  # drain in-flight sends before the final commit
+        await _commit(consumer, tracker, dedup, {})
         await consumer.stop()
+        await dedup.close()
 
 
 def main():
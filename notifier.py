@@ -1,18 +1,36 @@
 import os
 import httpx
+from dotenv import load_dotenv
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 import re
 import urllib.parse
+from functools import lru_cache
+from utils.price import Price
 
-async def send_price_card(bot, chat_id, product_url, price, product_id, product_name=None):
-    from datetime import datetime
-    now_str = datetime.now().strftime('%d %b %Y, %H:%M')
+load_dotenv()
+
+# Rendered (text, reply_markup) pairs are cached so every recipient of the
+# same product/price change reuses one rendering; only the send is per chat.
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "4096"))
+# Seconds price alerts are collected into one digest for users who never ran
+# /digest (0 = send each alert immediately)
+DIGEST_DEFAULT_WINDOW = int(os.getenv("DIGEST_DEFAULT_WINDOW", "0"))
+
+
+def _is_web_url(url) -> bool:
+    return bool(url) and (url.startswith('http://') or url.startswith('https://'))
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_price_card(product_url, price, product_id, product_name=None, updated_at=None):
+    """Text and markup of the tracking-started card. updated_at is the
+    '%d %b %Y, %H:%M' timestamp, so cached cards roll over every minute."""
     text = f"<b>Product tracking has started!</b>\n\n"
     text += "Sit back and relax — you'll be notified when the price changes.\n\n"
     text += f"☀️ <b>{product_name or 'Product'}</b>\n\n"
     text += f"Current Price: <b>{price}</b>\n\n"
     text += f"<a href='{product_url}'>Click here to open in Amazon!</a>\n\n"
-    text += f"⏱ Updated at [ {now_str} ]"
+    text += f"⏱ Updated at [ {updated_at} ]"
 
     # Price history URL using the product_url as a search query
     encoded_url = urllib.parse.quote(product_url, safe='')
@@ -25,31 +43,22 @@ async def send_price_card(bot, chat_id, product_url, price, product_id, product_
         ],
         [InlineKeyboardButton("🛑 Stop Tracking", callback_data=f"stop_{product_id}")]
     ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    return text, InlineKeyboardMarkup(keyboard)
 
-    await bot.send_message(
-        chat_id=chat_id,
-        text=text,
-        reply_markup=reply_markup,
-        parse_mode="HTML",
-        disable_web_page_preview=False
-    )
 
-async def send_price_notification_card(bot, chat_id, product_url, price, product_id, product_name=None, old_price=None):
-    # Determine if price increased or decreased
-    try:
-        new_price_val = float(str(price).replace('₹', '').replace(',', '').strip())
-        old_price_val = float(str(old_price).replace('₹', '').replace(',', '').strip()) if old_price else None
-    except Exception:
-        new_price_val = old_price_val = None
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_price_notification(product_url, price, product_id, product_name=None, old_price=None):
+    """Text and markup of the price-change card for one product/price pair."""
+    # price / old_price are utils.price.Price (strings from old events are parsed once)
+    new_price_val = Price.parse(price)
+    old_price_val = Price.parse(old_price)
 
     if old_price_val is not None and new_price_val is not None:
-        diff = abs(new_price_val - old_price_val)
-        diff_str = f"₹{diff:,.0f}"
-        if new_price_val < old_price_val:
-            change_text = f"<b>🟢 Product Price is decreased by {diff_str}.</b>"
-        elif new_price_val > old_price_val:
-            change_text = f"<b>🔴 Product Price is increased by {diff_str}.</b>"
+        diff = Price(abs(new_price_val.minor_units - old_price_val.minor_units), new_price_val.currency)
+        if new_price_val.minor_units < old_price_val.minor_units:
+            change_text = f"<b>🟢 Product Price is decreased by {diff}.</b>"
+        elif new_price_val.minor_units > old_price_val.minor_units:
+            change_text = f"<b>🔴 Product Price is increased by {diff}.</b>"
         else:
             change_text = f"<b>Price Unchanged:</b> {price}"
     else:
@@ -58,11 +67,11 @@ async def send_price_notification_card(bot, chat_id, product_url, price, product
     text = f"{change_text}\n\n"
     text += f"☀️ <b>{product_name or 'Product'}</b>\n\n"
     if old_price_val is not None and new_price_val is not None and new_price_val != old_price_val:
-        text += f"Previous price: <s>₹{old_price_val:,.0f}</s>\n"
-        text += f"Current Price: <b>₹{new_price_val:,.0f}</b>\n\n"
+        text += f"Previous price: <s>{old_price_val}</s>\n"
+        text += f"Current Price: <b>{new_price_val}</b>\n\n"
     else:
         text += f"Current Price: <b>{price}</b>\n\n"
-    if product_url and (product_url.startswith('http://') or product_url.startswith('https://')):
+    if _is_web_url(product_url):
         if "amazon" in product_url:
             text += f"<a href='{product_url}'>Click here to open in Amazon!</a>"
         elif "flipkart" in product_url:
@@ -71,10 +80,16 @@ async def send_price_notification_card(bot, chat_id, product_url, price, product
             text += f"<a href='{product_url}'>Click here to view product!</a>"
 
     keyboard = []
-    if product_url and (product_url.startswith('http://') or product_url.startswith('https://')):
+    if _is_web_url(product_url):
         keyboard.append([InlineKeyboardButton("✅ Buy Now", url=product_url)])
     keyboard.append([InlineKeyboardButton("🛑 Stop Tracking", callback_data=f"stop_{product_id}")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+async def send_price_card(bot, chat_id, product_url, price, product_id, product_name=None):
+    from datetime import datetime
+    now_str = datetime.now().strftime('%d %b %Y, %H:%M')
+    text, reply_markup = render_price_card(product_url, price, product_id, product_name, now_str)
 
     await bot.send_message(
         chat_id=chat_id,
@@ -82,4 +97,49 @@ async def send_price_notification_card(bot, chat_id, product_url, price, product
         reply_markup=reply_markup,
         parse_mode="HTML",
         disable_web_page_preview=False
-    )
\ No newline at end of file
+    )
+
+async def send_price_notification_card(bot, chat_id, product_url, price, product_id, product_name=None, old_price=None):
+    text, reply_markup = render_price_notification(product_url, price, product_id, product_name, old_price)
+
+    await bot.send_message(
+        chat_id=chat_id,
+        text=text,
+        reply_markup=reply_markup,
+        parse_mode="HTML",
+        disable_web_page_preview=False
+    )
+
+async def send_price_digest_card(bot, chat_id, items):
+    """Send one message summarising several price changes for a chat.
+
+    items: dicts with product_url, product_id, product_name, price, old_price
+    (utils.price.Price); each gets its own Buy Now / Stop Tracking row.
+    """
+    text = f"<b>📊 {len(items)} of your tracked products changed price</b>\n\n"
+    keyboard = []
+    for i, item in enumerate(items, 1):
+        new_price_val = Price.parse(item["price"])
+        old_price_val = Price.parse(item.get("old_price"))
+        name = item.get("product_name") or "Product"
+        short_name = name[:40] + "…" if len(name) > 40 else name
+        if old_price_val is not None and new_price_val is not None and new_price_val != old_price_val:
+            marker = "🟢" if new_price_val.minor_units < old_price_val.minor_units else "🔴"
+            text += f"{i}. {marker} <b>{short_name}</b>\n   <s>{old_price_val}</s> → <b>{new_price_val}</b>\n\n"
+        else:
+            text += f"{i}. <b>{short_name}</b>\n   Current Price: <b>{item['price']}</b>\n\n"
+
+        product_url = item.get("product_url")
+        row = []
+        if _is_web_url(product_url):
+            row.append(InlineKeyboardButton(f"✅ {i}. Buy Now", url=product_url))
+        row.append(InlineKeyboardButton(f"🛑 {i}. Stop", callback_data=f"stop_{item['product_id']}"))
+        keyboard.append(row)
+
+    await bot.send_message(
+        chat_id=chat_id,
+        text=text,
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode="HTML",
+        disable_web_page_preview=True
+    )
@@ -1,60 +1,53 @@
 import os
+import sys
+import time
+import signal
 import asyncio
 import logging
 from datetime import datetime
 from dotenv import load_dotenv
-from models import Product
+from typing import NamedTuple
+from sqlalchemy import and_, bindparam, func, or_, select, update
+from models import Product, user_tracked_products
 from db import Session
-from kafka_queue import get_producer, publish_price_change
+from kafka_queue import get_publisher
+from price_batcher import PriceChangeBatcher
+from scheduler import reschedule, POLL_MIN_INTERVAL
+from price_history import record_prices, prune_history
+from utils.scrape_engine import ScrapeEngine, SCRAPE_WORKERS, scrape_product
+from utils.price import Price
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
 # Max concurrent scrapes to avoid overwhelming target sites / getting blocked
 MAX_CONCURRENT_SCRAPES = int(os.getenv("MAX_CONCURRENT_SCRAPES", "5"))
+# Products read per keyset page; also the schedule write-back batch size
+POLL_PAGE_SIZE = int(os.getenv("POLL_PAGE_SIZE", "500"))
+
+
+# Set while a multi-process scrape engine is running (SCRAPE_WORKERS > 0)
+_engine: ScrapeEngine | None = None
 
 
 async def fetch_new_price(product_url: str):
-    """Scrape the current price for a product URL. Returns (new_price, product_name) or (None, None)."""
-    if "amazon" in product_url:
-        from utils.scraper import scrapper
-        from utils.amazon import extract_amazon_price_and_name
-        html, _ = await scrapper(product_url)
-        if html:
-            return await extract_amazon_price_and_name(html)
-    elif "flipkart" in product_url:
-        from utils.scraper import scrapper
-        from utils.flipkart import extract_flipkart_price_and_name
-        html, _ = await scrapper(product_url)
-        if html:
-            return await extract_flipkart_price_and_name(html)
-    return None, None
-
-
-def _update_price_in_db(product_db_id, new_price):
-    """Synchronous DB update — meant to run in a thread via asyncio.to_thread."""
-    session = Session()
-    try:
-        db_product = session.query(Product).filter_by(id=product_db_id).first()
-        if not db_product:
-            return None
-        db_product.last_known_price = new_price
-        db_product.last_checked = datetime.utcnow()
-        user_ids = [u.telegram_id for u in db_product.users]
-        session.commit()
-        return user_ids
-    except Exception:
-        session.rollback()
-        raise
-    finally:
-        session.close()
+    """Scrape the current price for a product URL. Returns (Price, product_name) or (None, None).
+
+    Runs on the scrape engine's worker processes when one is active,
+    otherwise in this process.
+    """
+    if _engine is not None:
+        return await _engine.scrape(product_url)
+    return await scrape_product(product_url)
 
 
-async def check_product(semaphore, producer, product_id, product_url,
+async def check_product(semaphore, batcher, product_id, product_url,
                         product_name, product_db_id, old_price):
     """Check a single product under the concurrency semaphore.
 
-    On price change → update DB (in thread) and publish event to Kafka.
+    On price change → hand it to the write-behind batcher, which updates
+    the DB and publishes the event to Kafka.
+    Returns (changed, new_price): changed is True/False, or None if the check failed.
     """
     async with semaphore:
         logger.info("Checking %s (%s)", product_db_id, product_name or "Unknown")
@@ -62,67 +55,322 @@ async def check_product(semaphore, producer, product_id, product_url,
             new_price, _ = await fetch_new_price(product_url)
         except Exception as e:
             logger.error("Scrape failed for %s: %s", product_db_id, e)
-            return
+            return None, None
 
-        if not new_price or new_price == old_price:
-            if new_price:
+        if new_price is None or new_price == old_price:
+            if new_price is not None:
                 logger.info("No change for %s", product_db_id)
+                return False, new_price
+            logger.warning("Could not fetch price for %s", product_db_id)
+            return None, None
+
+    logger.info("Price changed for %s: %s → %s", product_id, old_price, new_price)
+    await batcher.add(product_db_id, product_id, product_url, product_name,
+                      old_price, new_price)
+    return True, new_price
+
+
+class DueProduct(NamedTuple):
+    """Compact per-product record carried through the poll pipeline."""
+    db_id: int
+    product_id: str
+    url: str
+    name: str | None
+    price: Price | None
+    interval: int | None
+    watchers: int
+    due_at: datetime | None
+
+
+def _load_due_page(now, after: tuple | None, limit: int) -> list[DueProduct]:
+    """One keyset page of due products, most overdue first (never-checked
+    ones before all others), with their current interval and watcher count.
+
+    ``after`` is the (next_check_at, id) of the last product of the
+    previous page, or None for the first page.
+    """
+    session = Session()
+    try:
+        watchers = (
+            select(func.count())
+            .select_from(user_tracked_products)
+            .where(user_tracked_products.c.product_id == Product.id)
+            .scalar_subquery()
+        )
+        query = (
+            session.query(
+                Product.id, Product.product_id, Product.product_url, Product.product_name,
+                Product.last_price_minor, Product.price_currency, Product.last_known_price,
+                Product.check_interval, watchers, Product.next_check_at,
+            )
+            .filter(or_(Product.next_check_at.is_(None), Product.next_check_at <= now))
+        )
+        if after is not None:
+            after_due, after_id = after
+            if after_due is None:
+                query = query.filter(or_(
+                    Product.next_check_at.is_not(None),
+                    Product.id > after_id,
+                ))
             else:
-                logger.warning("Could not fetch price for %s", product_db_id)
-            return
+                query = query.filter(or_(
+                    Product.next_check_at > after_due,
+                    and_(Product.next_check_at == after_due, Product.id > after_id),
+                ))
+        rows = (
+            query
+            .order_by(Product.next_check_at.asc().nullsfirst(), Product.id)
+            .limit(limit)
+            .all()
+        )
+        # Detach data we need so session can close before async work
+        return [
+            DueProduct(db_id, pid, url, name, Price.from_db(minor, currency, text), interval, n, due)
+            for db_id, pid, url, name, minor, currency, text, interval, n, due in rows
+        ]
+    finally:
+        session.close()
+
+
+def _save_schedule(rows):
+    """Bulk-write check_interval / next_check_at / last_checked for checked products.
+
+    One executemany UPDATE; products deleted during the pass (/stop, /clear)
+    simply match no row instead of failing the whole batch.
+    """
+    if not rows:
+        return
+    stmt = (
+        update(Product.__table__)
+        .where(Product.__table__.c.id == bindparam("b_id"))
+        .values(
+            check_interval=bindparam("b_check_interval"),
+            next_check_at=bindparam("b_next_check_at"),
+            last_checked=bindparam("b_last_checked"),
+        )
+    )
+    session = Session()
+    try:
+        session.execute(stmt, [{f"b_{k}": v for k, v in row.items()} for row in rows])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
 
-        # --- Price changed: update DB in a thread to avoid blocking the loop ---
+async def _start_engine():
+    """Start the scrape engine if configured; return the scrape concurrency to use."""
+    global _engine
+    concurrency = MAX_CONCURRENT_SCRAPES
+    if SCRAPE_WORKERS > 0:
+        _engine = ScrapeEngine(SCRAPE_WORKERS)
+        await _engine.start()
+        # Keep every worker process busy
+        concurrency = max(concurrency, _engine.workers * _engine.concurrency)
+    return concurrency
+
+
+async def _shutdown(publisher):
+    """Stop the scrape engine, Kafka publisher, HTTP client and browser."""
+    global _engine
+    from utils.scraper import close_http_client, close_browser
+    if _engine is not None:
+        await _engine.stop()
+        _engine = None
+    await publisher.stop()
+    await close_http_client()
+    await close_browser()
+
+
+async def _feed_due_products(queue: asyncio.Queue, now, workers: int):
+    """Stream due products into the queue page by page, then one stop sentinel per worker."""
+    after = None
+    try:
+        while True:
+            page = await asyncio.to_thread(_load_due_page, now, after, POLL_PAGE_SIZE)
+            for record in page:
+                await queue.put(record)
+            if len(page) < POLL_PAGE_SIZE:
+                break
+            after = (page[-1].due_at, page[-1].db_id)
+    finally:
+        for _ in range(workers):
+            await queue.put(None)
+
+
+async def poll_pass(publisher, concurrency: int):
+    """Check every product that is currently due and reschedule it.
+
+    Products are read with keyset pagination and handed to a fixed set of
+    worker tasks through a bounded queue, and schedule updates are written
+    in batches, so memory stays flat regardless of catalogue size.
+    Returns the number of products checked.
+    """
+    now = datetime.utcnow()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    semaphore = asyncio.Semaphore(concurrency)
+    schedule = []
+    history = []
+    checked = 0
+
+    async def flush_writes():
+        rows, observations = schedule[:], history[:]
+        schedule.clear()
+        history.clear()
         try:
-            user_ids = await asyncio.to_thread(
-                _update_price_in_db, product_db_id, new_price
-            )
-            if user_ids is None:
-                return
-            logger.info("Price changed for %s: %s → %s", product_id, old_price, new_price)
+            await asyncio.to_thread(_save_schedule, rows)
         except Exception as e:
-            logger.error("DB error for %s: %s", product_db_id, e)
-            return
+            logger.error("Failed to save poll schedule: %s", e)
+        try:
+            await asyncio.to_thread(record_prices, observations)
+        except Exception as e:
+            logger.error("Failed to record price history: %s", e)
+
+    async def worker():
+        nonlocal checked
+        while (p := await queue.get()) is not None:
+            try:
+                changed, new_price = await check_product(
+                    semaphore, batcher, p.product_id, p.url, p.name, p.db_id, p.price
+                )
+            except Exception as e:
+                logger.error("Check failed for %s: %s", p.db_id, e)
+                changed, new_price = None, None
+            checked += 1
+            checked_at = datetime.utcnow()
+            interval, next_check_at = reschedule(p.interval, changed, p.watchers, checked_at)
+            schedule.append({
+                "id": p.db_id,
+                "check_interval": interval,
+                "next_check_at": next_check_at,
+                "last_checked": checked_at,
+            })
+            if new_price is not None:
+                history.append({
+                    "product_id": p.db_id,
+                    "observed_at": checked_at,
+                    "price_minor_units": new_price.minor_units,
+                })
+            if len(schedule) >= POLL_PAGE_SIZE:
+                await flush_writes()
+
+    batcher = PriceChangeBatcher(publisher)
+    await batcher.start()
+    feeder = asyncio.create_task(_feed_due_products(queue, now, concurrency))
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        if not feeder.done():
+            feeder.cancel()
+        await batcher.close()
+        await flush_writes()
+        await publisher.flush()  # one flush per pass; reports delivery failures together
+    await feeder  # surface DB read errors to the caller
+    return checked
 
-        # --- Publish to Kafka (notification is the consumer's job) ---
-        await publish_price_change(producer, {
-            "product_id": product_id,
-            "product_url": product_url,
-            "product_name": product_name,
-            "old_price": old_price,
-            "new_price": new_price,
-            "user_telegram_ids": user_ids,
-        })
+
+def _log_pass_stats():
+    from utils.scraper import get_tier_stats
+    from utils.parsing import get_fast_path_stats
+    logger.info("Fetch tier stats: %s", get_tier_stats())
+    logger.info("Extractor fast-path stats: %s", get_fast_path_stats())
 
 
 async def run_poll_cycle():
-    """Run a single poll cycle: fetch all products, check prices concurrently,
-    publish changes to Kafka."""
+    """Run a single poll cycle: check every product that is due, concurrently,
+    publish changes to Kafka and reschedule each product."""
     logger.info("Starting price check at %s", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
+    publisher = await get_publisher()
+    try:
+        checked = await poll_pass(publisher, await _start_engine())
+        logger.info("Checked %d due products", checked)
+    finally:
+        await _shutdown(publisher)
+
+    _log_pass_stats()
+    logger.info("Price check completed at %s", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+
+# ── Daemon mode ────────────────────────────────────────────────
+# Keeps the browser, DB pool, Kafka producer and scrape engine warm and
+# runs passes back to back (never overlapping), sleeping only until the
+# next product is due.
+POLL_DAEMON_MAX_SLEEP = float(os.getenv("POLL_DAEMON_MAX_SLEEP", "60"))
+# How often the daemon prunes/downsamples price history (seconds)
+PRICE_HISTORY_PRUNE_INTERVAL = float(os.getenv("PRICE_HISTORY_PRUNE_INTERVAL", "21600"))
+
+# Stats of the most recent daemon pass: started_at, duration_s, products
+last_pass: dict = {}
+
+
+def _seconds_until_next_due() -> float:
     session = Session()
     try:
-        products = session.query(Product).all()
-        # Detach data we need so session can close before async work
-        product_data = [
-            (p.id, p.product_id, p.product_url, p.product_name, p.last_known_price)
-            for p in products
-        ]
+        next_due = session.query(func.min(Product.next_check_at)).scalar()
     finally:
         session.close()
+    if next_due is None:
+        return POLL_DAEMON_MAX_SLEEP
+    return (next_due - datetime.utcnow()).total_seconds()
 
-    logger.info("Found %d products to check", len(product_data))
 
-    producer = await get_producer()
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT_SCRAPES)
+async def run_poll_daemon(stop: asyncio.Event | None = None):
+    """Poll continuously until ``stop`` is set (SIGINT/SIGTERM when run as a script)."""
+    stop = stop or asyncio.Event()
+    publisher = await get_publisher()
+    try:
+        concurrency = await _start_engine()
+        logger.info("Poller daemon started")
+        last_prune = None
+        while not stop.is_set():
+            if last_prune is None or time.monotonic() - last_prune >= PRICE_HISTORY_PRUNE_INTERVAL:
+                last_prune = time.monotonic()
+                try:
+                    await asyncio.to_thread(prune_history)
+                except Exception as e:
+                    logger.error("Price history prune failed: %s", e)
+            started = time.monotonic()
+            try:
+                checked = await poll_pass(publisher, concurrency)
+            except Exception as e:
+                logger.error("Poll pass failed: %s", e)
+                checked = 0
+            duration = time.monotonic() - started
+            last_pass.update(started_at=datetime.utcnow(), duration_s=duration, products=checked)
+            if checked:
+                logger.info("Poll pass checked %d products in %.1fs", checked, duration)
+                _log_pass_stats()
+                if duration > POLL_MIN_INTERVAL:
+                    logger.warning(
+                        "Poll pass took %.0fs, longer than POLL_MIN_INTERVAL (%ds): "
+                        "the product set is outgrowing the poll interval",
+                        duration, POLL_MIN_INTERVAL,
+                    )
 
-    tasks = [
-        check_product(semaphore, producer, pid, url, name, db_id, price)
-        for db_id, pid, url, name, price in product_data
-    ]
-    await asyncio.gather(*tasks, return_exceptions=True)
+            try:
+                delay = await asyncio.to_thread(_seconds_until_next_due)
+            except Exception as e:
+                logger.error("Could not read next due time: %s", e)
+                delay = POLL_DAEMON_MAX_SLEEP
+            delay = min(max(delay, 1.0), POLL_DAEMON_MAX_SLEEP)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        logger.info("Poller daemon stopping")
+        await _shutdown(publisher)
 
-    await producer.stop()
-    logger.info("Price check completed at %s", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+async def _run_daemon_with_signals():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await run_poll_daemon(stop)
 
 
 def run_poll_once():
@@ -134,5 +382,17 @@ def run_poll_once():
     asyncio.run(run_poll_cycle())
 
 
+def run_poll_forever():
+    """Entry point for daemon mode (``python poller.py --daemon``)."""
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO,
+    )
+    asyncio.run(_run_daemon_with_signals())
+
+
 if __name__ == "__main__":
-    run_poll_once()
\ No newline at end of file
+    if "--daemon" in sys.argv[1:] or os.getenv("POLLER_MODE") == "daemon":
+        run_poll_forever()
+    else:
+        run_poll_once()
\ No newline at end of file
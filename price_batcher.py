@@ -0,0 +1,152 @@
+"""
+Write-behind batching of price changes found by the poller.
+
+check_product used to open a session per changed product, reload it,
+lazy-load its watchers and commit — three round trips per change. The
+batcher collects changes from many checks and, per batch, issues one
+UPDATE (CASE on id) for the new prices and one join over
+user_tracked_products for every watcher's telegram_id, then publishes
+the Kafka events for the batch.
+"""
+
+import os
+import uuid
+import asyncio
+import logging
+from datetime import datetime
+from sqlalchemy import case, select, update
+from models import Product, User, user_tracked_products
+from db import Session
+
+logger = logging.getLogger(__name__)
+
+PRICE_BATCH_SIZE = int(os.getenv("PRICE_BATCH_SIZE", "200"))
+PRICE_BATCH_INTERVAL = float(os.getenv("PRICE_BATCH_INTERVAL", "2"))  # seconds
+
+
+def _apply_price_changes(changes: list[dict]) -> dict[int, list[tuple[int, int | None]]]:
+    """Write a batch of new prices and return
+    {product db id: [(watcher telegram_id, digest_window), ...]}.
+
+    Products deleted since they were read are absent from the result.
+    Synchronous — meant to run in a thread via asyncio.to_thread.
+    """
+    ids = [c["db_id"] for c in changes]
+    now = datetime.utcnow()
+    session = Session()
+    try:
+        session.execute(
+            update(Product)
+            .where(Product.id.in_(ids))
+            .values(
+                last_known_price=case(
+                    {c["db_id"]: str(c["new_price"]) for c in changes}, value=Product.id
+                ),
+                last_price_minor=case(
+                    {c["db_id"]: c["new_price"].minor_units for c in changes}, value=Product.id
+                ),
+                price_currency=case(
+                    {c["db_id"]: c["new_price"].currency for c in changes}, value=Product.id
+                ),
+                last_checked=now,
+                last_changed_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        rows = session.execute(
+            select(Product.id, User.telegram_id, User.digest_window)
+            .select_from(Product)
+            .outerjoin(user_tracked_products, user_tracked_products.c.product_id == Product.id)
+            .outerjoin(User, User.id == user_tracked_products.c.user_id)
+            .where(Product.id.in_(ids))
+        ).all()
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+    watchers: dict[int, list[tuple[int, int | None]]] = {}
+    for product_db_id, telegram_id, digest_window in rows:
+        ids_for_product = watchers.setdefault(product_db_id, [])
+        if telegram_id is not None:
+            ids_for_product.append((telegram_id, digest_window))
+    return watchers
+
+
+class PriceChangeBatcher:
+    """Collects price changes and flushes them by size or every PRICE_BATCH_INTERVAL."""
+
+    def __init__(self, publisher, batch_size: int = PRICE_BATCH_SIZE,
+                 flush_interval: float = PRICE_BATCH_INTERVAL):
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: list[dict] = []
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+
+    async def start(self):
+        self._timer = asyncio.create_task(self._flush_periodically())
+
+    async def close(self):
+        """Stop the timer and flush whatever is still pending."""
+        if self._timer is not None:
+            self._timer.cancel()
+            await asyncio.gather(self._timer, return_exceptions=True)
+            self._timer = None
+        await self.flush()
+
+    async def add(self, product_db_id, product_id, product_url, product_name,
+                  old_price, new_price):
+        """Queue one price change (prices are utils.price.Price); flushes (and waits)
+        once the batch is full."""
+        self._pending.append({
+            "db_id": product_db_id,
+            "product_id": product_id,
+            "product_url": product_url,
+            "product_name": product_name,
+            "old_price": old_price,
+            "new_price": new_price,
+        })
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            try:
+                watchers = await asyncio.to_thread(_apply_price_changes, batch)
+            except Exception as e:
+                logger.error("DB error writing %d price changes: %s", len(batch), e)
+                return
+            logger.info("Wrote %d price changes in one batch", len(batch))
+
+        # --- Publish to Kafka (notification is the consumer's job) ---
+        for change in batch:
+            if change["db_id"] not in watchers:
+                continue  # product was deleted meanwhile
+            old_price, new_price = change["old_price"], change["new_price"]
+            recipients = watchers[change["db_id"]]
+            await self.publisher.publish({
+                "event_id": uuid.uuid4().hex,
+                "product_id": change["product_id"],
+                "product_url": change["product_url"],
+                "product_name": change["product_name"],
+                "old_price": str(old_price) if old_price else None,
+                "new_price": str(new_price),
+                "old_price_minor": old_price.minor_units if old_price else None,
+                "new_price_minor": new_price.minor_units,
+                "currency": new_price.currency,
+                "user_telegram_ids": [tid for tid, _ in recipients],
+                # Only users who changed their digest window; keys are str for JSON
+                "digest_windows": {str(tid): w for tid, w in recipients if w is not None},
+            })
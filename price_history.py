@@ -0,0 +1,121 @@
+"""
+Append-only price history.
+
+Every successful check appends ``(product_id, observed_at,
+price_minor_units)`` to ``price_history``. The poller bulk-inserts rows in
+batches; ``prune_history`` keeps full resolution for recent points,
+downsamples older ones to the last observation per product per day, and
+drops anything past the retention window.
+
+Prune from cron (or let the poller daemon do it periodically):
+    python price_history.py --prune
+"""
+
+import os
+import sys
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import delete, exists, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from models import PriceHistory, Product
+from db import Session
+
+logger = logging.getLogger(__name__)
+
+# Keep every point for this many days, then one point per product per day
+PRICE_HISTORY_RAW_DAYS = int(os.getenv("PRICE_HISTORY_RAW_DAYS", "30"))
+# Drop points older than this
+PRICE_HISTORY_RETENTION_DAYS = int(os.getenv("PRICE_HISTORY_RETENTION_DAYS", "730"))
+
+
+def record_prices(rows: list[dict]):
+    """Bulk-insert observations: dicts with product_id, observed_at, price_minor_units.
+
+    Rows for products deleted since they were scraped (/stop, /clear) are
+    dropped rather than failing the batch on the foreign key.
+    """
+    if not rows:
+        return
+    session = Session()
+    try:
+        for attempt in range(2):
+            ids = {row["product_id"] for row in rows}
+            existing = set(session.scalars(select(Product.id).where(Product.id.in_(ids))))
+            rows = [row for row in rows if row["product_id"] in existing]
+            if not rows:
+                return
+            try:
+                session.execute(insert(PriceHistory), rows)
+                session.commit()
+                return
+            except IntegrityError:
+                # A product was deleted between the check and the insert
+                session.rollback()
+                if attempt:
+                    raise
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def recent_prices(product_db_id: int, limit: int = 30) -> list[tuple[datetime, int]]:
+    """The last ``limit`` (observed_at, price_minor_units) points for a product, newest first."""
+    session = Session()
+    try:
+        return [
+            tuple(r) for r in session.execute(
+                select(PriceHistory.observed_at, PriceHistory.price_minor_units)
+                .where(PriceHistory.product_id == product_db_id)
+                .order_by(PriceHistory.observed_at.desc())
+                .limit(limit)
+            )
+        ]
+    finally:
+        session.close()
+
+
+def prune_history(now: datetime | None = None) -> tuple[int, int]:
+    """Apply retention and downsampling. Returns (expired, downsampled) row counts."""
+    now = now or datetime.utcnow()
+    raw_cutoff = now - timedelta(days=PRICE_HISTORY_RAW_DAYS)
+    retention_cutoff = now - timedelta(days=PRICE_HISTORY_RETENTION_DAYS)
+    later = aliased(PriceHistory)
+    session = Session()
+    try:
+        expired = session.execute(
+            delete(PriceHistory).where(PriceHistory.observed_at < retention_cutoff)
+        ).rowcount
+        # Past the raw window keep only the last point of each product-day
+        downsampled = session.execute(
+            delete(PriceHistory)
+            .where(PriceHistory.observed_at < raw_cutoff)
+            .where(
+                exists()
+                .where(later.product_id == PriceHistory.product_id)
+                .where(func.date(later.observed_at) == func.date(PriceHistory.observed_at))
+                .where(later.observed_at > PriceHistory.observed_at)
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    logger.info("Pruned price history: %d expired, %d downsampled", expired, downsampled)
+    return expired, downsampled
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO,
+    )
+    if "--prune" in sys.argv[1:]:
+        prune_history()
+    else:
+        print("usage: python price_history.py --prune")
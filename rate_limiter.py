@@ -0,0 +1,86 @@
+import os
+import time
+import uuid
+import logging
+from collections import deque
+from dotenv import load_dotenv
+from redis.exceptions import RedisError
+from redis_client import get_redis, redis_available, mark_redis_down
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT = int(os.getenv("RATE_LIMIT", "10"))  # requests
+RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW", "60"))  # seconds
+# After a Redis failure, use the in-process limiter for this long before retrying
+RATE_LIMIT_REDIS_RETRY = float(os.getenv("RATE_LIMIT_REDIS_RETRY", "30"))
+
+# Sliding window log in one round trip. Uses the Redis clock so several bot
+# instances agree on the window; each request gets a unique member.
+# Returns {limited (0/1), requests in the window before this one}.
+_SLIDING_WINDOW = """
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+local window = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count >= tonumber(ARGV[2]) then
+    return {1, count}
+end
+redis.call('ZADD', KEYS[1], now, ARGV[3])
+redis.call('PEXPIRE', KEYS[1], window)
+return {0, count}
+"""
+
+_script = None
+
+
+class LocalRateLimiter:
+    """In-process sliding window log, used while Redis is unreachable."""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._hits: dict[str, deque] = {}
+
+    def hit(self, key: str, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        hits = self._hits.setdefault(key, deque())
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        count = len(hits)
+        if count >= self.limit:
+            return True, count
+        hits.append(now)
+        if len(self._hits) > 10_000:
+            self._prune(now)
+        return False, count
+
+    def _prune(self, now: float):
+        cutoff = now - self.window
+        for key in [k for k, h in self._hits.items() if not h or h[-1] <= cutoff]:
+            del self._hits[key]
+
+
+_local = LocalRateLimiter(RATE_LIMIT, RATE_LIMIT_WINDOW)
+
+
+async def is_rate_limited(user_id):
+    """Record a request from user_id. Returns (limited, requests already in the window)."""
+    global _script
+    key = f"rate_limit:{user_id}"
+    if redis_available():
+        try:
+            client = get_redis()
+            if _script is None:
+                _script = client.register_script(_SLIDING_WINDOW)
+            limited, count = await _script(
+                keys=[key], args=[RATE_LIMIT_WINDOW * 1000, RATE_LIMIT, uuid.uuid4().hex],
+                client=client,
+            )
+            return bool(limited), int(count)
+        except (RedisError, OSError) as e:
+            mark_redis_down(RATE_LIMIT_REDIS_RETRY)
+            logger.warning("Redis rate limiter unavailable (%s); using in-process limits for %.0fs",
+                           e, RATE_LIMIT_REDIS_RETRY)
+    return _local.hit(key)
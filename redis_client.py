@@ -0,0 +1,51 @@
+import os
+import time
+import logging
+from dotenv import load_dotenv
+import redis.asyncio as redis
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "20"))
+# Keep Redis failures fast: callers fall back to in-process state
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "0.5"))
+# After a Redis failure, callers skip Redis for this long (seconds)
+REDIS_RETRY_AFTER = float(os.getenv("REDIS_RETRY_AFTER", "30"))
+
+_client: redis.Redis | None = None
+_down_until = 0.0
+
+
+def get_redis() -> redis.Redis:
+    """Process-wide Redis client backed by a connection pool (created on first use)."""
+    global _client
+    if _client is None:
+        _client = redis.from_url(
+            REDIS_URL,
+            decode_responses=True,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            socket_timeout=REDIS_TIMEOUT,
+            socket_connect_timeout=REDIS_TIMEOUT,
+        )
+    return _client
+
+
+def redis_available() -> bool:
+    """False while in the backoff window after a failure: use the fallback path."""
+    return time.monotonic() >= _down_until
+
+
+def mark_redis_down(seconds: float = REDIS_RETRY_AFTER):
+    """Record a Redis failure so callers skip Redis for ``seconds``."""
+    global _down_until
+    _down_until = max(_down_until, time.monotonic() + seconds)
+
+
+async def close_redis():
+    """Close the pooled client; the next get_redis() opens a new pool."""
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.aclose()
@@ -0,0 +1,50 @@
+"""
+Adaptive per-product poll scheduling.
+
+Each product carries its own ``check_interval`` and ``next_check_at``.
+Stable prices back off geometrically up to POLL_MAX_INTERVAL, a price
+change snaps the interval back to POLL_MIN_INTERVAL, and products with
+many watchers are checked proportionally sooner. The poller only picks up
+products whose ``next_check_at`` is due.
+"""
+
+import os
+import math
+import random
+from datetime import datetime, timedelta
+
+POLL_MIN_INTERVAL = int(os.getenv("POLL_MIN_INTERVAL", "600"))        # 10 min
+POLL_MAX_INTERVAL = int(os.getenv("POLL_MAX_INTERVAL", "86400"))      # 24 h
+POLL_BACKOFF = float(os.getenv("POLL_BACKOFF", "1.5"))
+# How strongly watcher count shortens the delay (0 disables the boost)
+POLL_POPULARITY_WEIGHT = float(os.getenv("POLL_POPULARITY_WEIGHT", "0.5"))
+POLL_JITTER = 0.1  # ±10% so products added together don't stay in lockstep
+
+
+def next_interval(interval: int | None, changed: bool | None) -> int:
+    """New base interval (seconds) after a check.
+
+    changed=True → reset to the minimum, False → back off,
+    None (scrape failed) → keep the current interval.
+    """
+    interval = interval or POLL_MIN_INTERVAL
+    if changed is None:
+        return interval
+    if changed:
+        return POLL_MIN_INTERVAL
+    return min(POLL_MAX_INTERVAL, int(interval * POLL_BACKOFF))
+
+
+def effective_delay(interval: int, watchers: int) -> float:
+    """Delay until the next check: the base interval shortened for popular products."""
+    boost = 1 + POLL_POPULARITY_WEIGHT * math.log2(1 + max(0, watchers))
+    delay = max(POLL_MIN_INTERVAL, interval / boost)
+    return delay * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+
+
+def reschedule(interval: int | None, changed: bool | None, watchers: int,
+               now: datetime | None = None) -> tuple[int, datetime]:
+    """Return (check_interval, next_check_at) for a product after a check."""
+    now = now or datetime.utcnow()
+    interval = next_interval(interval, changed)
+    return interval, now + timedelta(seconds=effective_delay(interval, watchers))
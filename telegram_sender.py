@@ -0,0 +1,223 @@
+"""
+Concurrent Telegram sender that respects the Bot API rate limits.
+
+Telegram allows roughly 30 messages/s per bot and about 1 message/s per
+chat. Sending one message at a time caps throughput at one HTTP round
+trip per message; this sender runs many sends concurrently while:
+
+- a global token bucket keeps the bot under SENDER_GLOBAL_RATE msg/s,
+- each chat has its own FIFO and cooldown (SENDER_PER_CHAT_INTERVAL), so a
+  busy chat never blocks a worker or reorders its own messages,
+- a ``RetryAfter`` pauses only that chat, unless several chats hit it at
+  once (a bot-wide flood limit), in which case the whole bucket pauses.
+
+Queue depth, in-flight count and send latency are available from
+``stats()`` and logged periodically.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+SENDER_WORKERS = int(os.getenv("SENDER_WORKERS", "30"))
+SENDER_GLOBAL_RATE = float(os.getenv("SENDER_GLOBAL_RATE", "30"))          # msg/s for the bot
+SENDER_PER_CHAT_INTERVAL = float(os.getenv("SENDER_PER_CHAT_INTERVAL", "1"))  # s between msgs to one chat
+SENDER_MAX_RETRIES = int(os.getenv("SENDER_MAX_RETRIES", "3"))
+SENDER_MAX_PENDING = int(os.getenv("SENDER_MAX_PENDING", "10000"))
+# RetryAfter from this many distinct chats within one second → pause globally
+_GLOBAL_PAUSE_CHATS = 3
+_STATS_LOG_INTERVAL = 30
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    value = error.retry_after
+    return value.total_seconds() if hasattr(value, "total_seconds") else float(value)
+
+
+class TokenBucket:
+    """Async token bucket; ``pause`` blocks all acquirers for a while."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class TelegramSender:
+    """Run ``send()`` callables concurrently under global and per-chat limits."""
+
+    def __init__(self, workers: int = SENDER_WORKERS,
+                 global_rate: float = SENDER_GLOBAL_RATE,
+                 per_chat_interval: float = SENDER_PER_CHAT_INTERVAL,
+                 max_retries: int = SENDER_MAX_RETRIES,
+                 max_pending: int = SENDER_MAX_PENDING):
+        self.workers = workers
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(global_rate)
+        self._chats: dict[int, deque] = {}       # chat_id -> pending (send, future, attempts)
+        self._scheduled: set[int] = set()        # chats queued, cooling down or being sent to
+        self._ready_at: dict[int, float] = {}    # chat_id -> end of its cooldown
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._capacity = asyncio.Semaphore(max_pending)
+        self._tasks: list[asyncio.Task] = []
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._pending = 0
+        self._in_flight = 0
+        self._recent_retry_after: deque = deque()  # (time, chat_id)
+        self._latencies: deque = deque(maxlen=1000)
+        self.sent = 0
+        self.failed = 0
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._log_stats()))
+
+    async def stop(self):
+        """Wait for queued messages to be sent, then stop the workers."""
+        await self.drain()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def drain(self):
+        await self._idle.wait()
+
+    async def submit(self, chat_id: int, send) -> asyncio.Future:
+        """Queue ``send()`` (a coroutine function) for ``chat_id``.
+
+        Waits only when SENDER_MAX_PENDING messages are already queued.
+        Returns a future resolved with the send result, or its final error.
+        """
+        await self._capacity.acquire()
+        fut = asyncio.get_running_loop().create_future()
+        self._chats.setdefault(chat_id, deque()).append((send, fut, 0))
+        self._pending += 1
+        self._idle.clear()
+        self._schedule(chat_id)
+        return fut
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        pct = lambda p: round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else None
+        return {
+            "queue_depth": self._pending - self._in_flight,
+            "in_flight": self._in_flight,
+            "sent": self.sent,
+            "failed": self.failed,
+            "latency_p50_ms": pct(0.5),
+            "latency_p99_ms": pct(0.99),
+        }
+
+    # ── internals ──────────────────────────────────────────────
+
+    def _schedule(self, chat_id: int):
+        if chat_id in self._scheduled or not self._chats.get(chat_id):
+            return
+        self._scheduled.add(chat_id)
+        delay = self._ready_at.get(chat_id, 0) - time.monotonic()
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, chat_id)
+        else:
+            self._ready.put_nowait(chat_id)
+
+    def _finish(self, fut: asyncio.Future, result=None, error: BaseException | None = None):
+        self._pending -= 1
+        self._capacity.release()
+        if not fut.done():
+            if error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(result)
+        if self._pending == 0:
+            self._idle.set()
+
+    def _on_retry_after(self, chat_id: int, seconds: float):
+        now = time.monotonic()
+        self._recent_retry_after.append((now, chat_id))
+        while self._recent_retry_after and now - self._recent_retry_after[0][0] > 1:
+            self._recent_retry_after.popleft()
+        if len({c for _, c in self._recent_retry_after}) >= _GLOBAL_PAUSE_CHATS:
+            logger.warning("Flood limit across chats, pausing all sends for %.1fs", seconds)
+            self.bucket.pause(seconds)
+        else:
+            logger.warning("RetryAfter for chat %s, pausing it for %.1fs", chat_id, seconds)
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            # The chat stays in _scheduled until this send finishes, so a
+            # submit() meanwhile cannot hand it to a second worker
+            queue = self._chats.get(chat_id)
+            if not queue:
+                self._scheduled.discard(chat_id)
+                self._chats.pop(chat_id, None)
+                continue
+            send, fut, attempts = queue.popleft()
+            cooldown = self.per_chat_interval
+
+            await self.bucket.acquire()
+            self._in_flight += 1
+            started = time.monotonic()
+            try:
+                result = await send()
+            except RetryAfter as e:
+                seconds = _retry_seconds(e)
+                self._on_retry_after(chat_id, seconds)
+                cooldown = max(cooldown, seconds)
+                if attempts < self.max_retries:
+                    queue.appendleft((send, fut, attempts + 1))  # keep chat order
+                else:
+                    self.failed += 1
+                    self._finish(fut, error=e)
+            except Exception as e:
+                self.failed += 1
+                self._finish(fut, error=e)
+            else:
+                self.sent += 1
+                self._latencies.append(time.monotonic() - started)
+                self._finish(fut, result)
+            finally:
+                self._in_flight -= 1
+
+            self._ready_at[chat_id] = time.monotonic() + cooldown
+            self._scheduled.discard(chat_id)
+            if queue:
+                self._schedule(chat_id)
+            else:
+                self._chats.pop(chat_id, None)
+
+    async def _log_stats(self):
+        while True:
+            await asyncio.sleep(_STATS_LOG_INTERVAL)
+            now = time.monotonic()
+            self._ready_at = {c: t for c, t in self._ready_at.items() if t > now}
+            if self.sent or self._pending:
+                logger.info("Telegram sender stats: %s", self.stats())
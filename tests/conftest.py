@@ -0,0 +1,27 @@
+import os
+import tempfile
+
+import pytest
+
+# db.py builds its engines from DATABASE_URL at import time
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+
+from sqlalchemy import event  # noqa: E402
+from db import engine, Session  # noqa: E402
+from models import Base  # noqa: E402
+
+
+@event.listens_for(engine, "connect")
+def _enforce_foreign_keys(dbapi_connection, _):
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+
+@pytest.fixture
+def session():
+    engine.dispose()  # reconnect so pooled connections enforce foreign keys
+    session = Session()
+    yield session
+    session.close()
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
@@ -0,0 +1,46 @@
+import json
+
+from utils.flipkart import parse_flipkart_price_and_name
+
+
+def _page(json_ld, body=""):
+    return (
+        "<html><head>"
+        f'<script type="application/ld+json">{json.dumps(json_ld)}</script>'
+        f"</head><body>{body}</body></html>"
+    )
+
+
+# Price outside the fast-path markers, so the scan consults JSON-LD and the
+# lxml parse has to find it
+DOM = '<h1 class="_6EBuvT">Phone</h1><span>₹1,299</span>'
+
+
+def test_json_ld_type_list():
+    html = _page({"@type": ["Product", "Thing"], "name": "Phone",
+                  "offers": {"@type": "Offer", "price": "1299"}})
+    price, name = parse_flipkart_price_and_name(html)
+    assert str(price) == "₹1,299"
+    assert name == "Phone"
+
+
+def test_json_ld_offers_list_skips_non_dicts():
+    html = _page({"@type": "Product", "name": "Phone",
+                  "offers": ["InStock", {"@type": "Offer", "price": 1299.5}]})
+    price, name = parse_flipkart_price_and_name(html)
+    assert str(price) == "₹1,299.50"
+    assert name == "Phone"
+
+
+def test_json_ld_offers_string_falls_back_to_dom():
+    html = _page({"@type": "Product", "name": "Phone", "offers": "https://schema.org/InStock"}, DOM)
+    price, name = parse_flipkart_price_and_name(html)
+    assert str(price) == "₹1,299"
+    assert name == "Phone"
+
+
+def test_json_ld_offers_list_of_strings_falls_back_to_dom():
+    html = _page({"@type": "Product", "name": "Phone", "offers": ["InStock"]}, DOM)
+    price, name = parse_flipkart_price_and_name(html)
+    assert str(price) == "₹1,299"
+    assert name == "Phone"
@@ -0,0 +1,80 @@
+import asyncio
+import types
+
+import pytest
+
+import db
+import handlers
+from models import Product
+from utils import scraper
+from utils.ingest import IngestResult
+from utils.price import Price
+
+ASIN = "B0CHX1W1XY"
+
+
+class _Message:
+    def __init__(self, text):
+        self.text = text
+
+    async def reply_text(self, text, **kwargs):
+        return self
+
+    async def edit_text(self, text, **kwargs):
+        return self
+
+
+def _update(text):
+    return types.SimpleNamespace(
+        message=_Message(text),
+        effective_user=types.SimpleNamespace(id=42, username="user"),
+        effective_chat=types.SimpleNamespace(id=42),
+    )
+
+
+async def _handle(text):
+    try:
+        await handlers.handle_message(_update(text), types.SimpleNamespace(bot=None))
+    finally:
+        await db.async_engine.dispose()
+
+
+@pytest.fixture
+def links(monkeypatch):
+    """Short links redirect to the product over HTTP; records every page fetch."""
+    calls = {"resolved": [], "ingested": []}
+
+    async def http_resolve(url):
+        calls["resolved"].append(url)
+        return f"https://www.amazon.in/Some-Phone/dp/{ASIN}?tag=deals-21"
+
+    async def ingest_url(url):
+        calls["ingested"].append(url)
+        return IngestResult(url, "amazon", Price.parse("₹1,299"), "Phone", ASIN)
+
+    async def send_price_card(**kwargs):
+        pass
+
+    monkeypatch.setattr(scraper, "http_resolve", http_resolve)
+    monkeypatch.setattr(handlers, "ingest_url", ingest_url)
+    monkeypatch.setattr(handlers, "send_price_card", send_price_card)
+    return calls
+
+
+def test_short_link_to_known_product_skips_page_fetch(session, links):
+    session.add(Product(product_id=ASIN, product_url=f"https://www.amazon.in/dp/{ASIN}",
+                        last_known_price="₹1,299", last_price_minor=129900, price_currency="INR"))
+    session.commit()
+
+    asyncio.run(_handle("https://amzn.to/3XyZabc"))
+
+    assert links["resolved"] == ["https://amzn.to/3XyZabc"]
+    assert links["ingested"] == []
+
+
+def test_short_link_fetches_canonical_product_url(session, links):
+    asyncio.run(_handle("look https://amzn.in/d/9Pq2kLm"))
+
+    assert links["resolved"] == ["https://amzn.in/d/9Pq2kLm"]
+    assert links["ingested"] == [f"https://www.amazon.in/dp/{ASIN}"]
+    assert session.query(Product.product_id).all() == [(ASIN,)]
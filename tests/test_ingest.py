@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+from utils import ingest
+
+
+@pytest.fixture
+def no_fetch(monkeypatch):
+    async def fail(*args, **kwargs):
+        raise AssertionError("unsupported link was fetched")
+    monkeypatch.setattr(ingest, "_http_fetch", fail)
+    monkeypatch.setattr(ingest, "_fetch_page", fail)
+
+
+def test_unsupported_host_is_rejected_without_fetching(no_fetch):
+    result = asyncio.run(ingest.ingest_url("https://www.example.com/dp/B0CHX1W1XY"))
+    assert result.site is None
+    assert result.final_url == "https://www.example.com/dp/B0CHX1W1XY"
+
+
+def test_supported_hosts():
+    assert ingest.is_supported_url("https://www.amazon.in/dp/B0CHX1W1XY")
+    assert ingest.is_supported_url("https://amzn.to/3XyZabc")
+    assert ingest.is_supported_url("https://www.flipkart.com/x/p/itm6ac6485515ae4")
+    assert ingest.is_supported_url("https://fkrt.it/abcdEFgh")
+    assert not ingest.is_supported_url("https://evil.example/amazon")
+    assert not ingest.is_supported_url("https://amazon.evil.example/dp/B0CHX1W1XY")
@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+
+from models import Product
+from poller import _save_schedule
+
+
+def test_save_schedule_skips_deleted_products(session):
+    kept = Product(product_id="B000000001", product_url="https://www.amazon.in/dp/B000000001")
+    gone = Product(product_id="B000000002", product_url="https://www.amazon.in/dp/B000000002")
+    session.add_all([kept, gone])
+    session.commit()
+    kept_id, gone_id = kept.id, gone.id
+
+    now = datetime(2026, 1, 1)
+    rows = [
+        {"id": pid, "check_interval": 600, "next_check_at": now + timedelta(minutes=10), "last_checked": now}
+        for pid in (kept_id, gone_id)
+    ]
+    session.delete(gone)  # /stop or /clear during the pass
+    session.commit()
+
+    _save_schedule(rows)
+
+    session.expire_all()
+    product = session.get(Product, kept_id)
+    assert product.check_interval == 600
+    assert product.next_check_at == now + timedelta(minutes=10)
+    assert product.last_checked == now
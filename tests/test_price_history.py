@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from models import PriceHistory, Product
+from price_history import record_prices
+
+
+def test_record_prices_drops_products_deleted_before_flush(session):
+    kept = Product(product_id="B000000001", product_url="https://www.amazon.in/dp/B000000001")
+    gone = Product(product_id="B000000002", product_url="https://www.amazon.in/dp/B000000002")
+    session.add_all([kept, gone])
+    session.commit()
+    kept_id, gone_id = kept.id, gone.id
+
+    # Scraped in this pass ...
+    now = datetime(2026, 1, 1)
+    rows = [
+        {"product_id": pid, "observed_at": now, "price_minor_units": 129900}
+        for pid in (kept_id, gone_id)
+    ]
+    # ... then one product is deleted before the history is flushed
+    session.delete(gone)
+    session.commit()
+
+    record_prices(rows)
+
+    history = session.query(PriceHistory.product_id, PriceHistory.price_minor_units).all()
+    assert history == [(kept_id, 129900)]
@@ -0,0 +1,88 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from dotenv import load_dotenv
+from redis.exceptions import RedisError
+from redis_client import get_redis, redis_available, mark_redis_down
+from utils.url_normalizer import normalize_product_url, strip_tracking
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# How long a submitted URL -> product id mapping is trusted (seconds)
+URL_CACHE_TTL = int(os.getenv("URL_CACHE_TTL", str(7 * 24 * 3600)))
+# Entries kept in the in-process LRU in front of Redis
+URL_CACHE_SIZE = int(os.getenv("URL_CACHE_SIZE", "10000"))
+
+
+def cache_key(url: str) -> str:
+    """Canonical product URL when the link names one offline, else the link
+    without tracking parameters, so link variants share one entry."""
+    product = normalize_product_url(url)
+    return product.url if product else strip_tracking(url)
+
+
+class TTLCache:
+    """Small LRU mapping whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def get(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+_local = TTLCache(URL_CACHE_SIZE, URL_CACHE_TTL)
+
+
+async def lookup_product_id(url: str) -> str | None:
+    """Product id a submitted URL resolved to before, or None."""
+    key = cache_key(url)
+    product_id = _local.get(key)
+    if product_id is not None:
+        return product_id
+    if not redis_available():
+        return None
+    try:
+        product_id = await get_redis().get(f"url_product:{key}")
+    except (RedisError, OSError) as e:
+        mark_redis_down()
+        logger.debug("URL cache lookup skipped Redis: %s", e)
+        return None
+    if product_id is not None:
+        _local.set(key, product_id)
+    return product_id
+
+
+async def remember_product_id(product_id: str, *urls: str):
+    """Map each of ``urls`` (as submitted, expanded, final ...) to product_id."""
+    keys = {cache_key(url) for url in urls if url}
+    for key in keys:
+        _local.set(key, product_id)
+    if not redis_available():
+        return
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.set(f"url_product:{key}", product_id, ex=URL_CACHE_TTL)
+            await pipe.execute()
+    except (RedisError, OSError) as e:
+        mark_redis_down()
+        logger.debug("URL cache write skipped Redis: %s", e)
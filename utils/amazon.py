@@ -1,27 +1,77 @@
-from bs4 import BeautifulSoup
 import re
-from playwright.async_api import async_playwright
-import asyncio
+from utils.price import Price
+from utils.parsing import (
+    run_parser, parse_html, has_class, first, text_of,
+    class_element_re, strip_tags, record_fast_path,
+)
+
+# --- Fast path: read the price spans and title straight from the HTML string ---
+_PRICE_SYMBOL_RE = class_element_re("span", "a-price-symbol")
+_PRICE_WHOLE_RE = class_element_re("span", "a-price-whole")
+_PRICE_FRACTION_RE = class_element_re("span", "a-price-fraction")
+_TITLE_RE = re.compile(r'<span\b[^>]*\bid="productTitle"[^>]*>(.*?)</span>', re.S)
+
+
+def _format_amazon_price(symbol: str, whole: str, fraction: str | None) -> str:
+    whole = re.sub(r"[^\d]", "", whole)
+    fraction = re.sub(r"[^\d]", "", fraction) if fraction is not None else "00"
+    fraction = (fraction + "00")[:2]
+    return f"{symbol}{whole}.{fraction}"
+
+
+def scan_amazon_price_and_name(html: str):
+    """String-scan extractor; returns (None, None) unless both fields are found."""
+    whole = _PRICE_WHOLE_RE.search(html)
+    title = _TITLE_RE.search(html)
+    if not whole or not title:
+        return None, None
+    symbol = _PRICE_SYMBOL_RE.search(html)
+    fraction = _PRICE_FRACTION_RE.search(html)
+    price = _format_amazon_price(
+        strip_tags(symbol.group(1)) if symbol else "",
+        # a-price-whole wraps the a-price-decimal span, so only its digits count
+        strip_tags(whole.group(1)),
+        strip_tags(fraction.group(1)) if fraction else None,
+    )
+    return price, strip_tags(title.group(1)) or None
 
-playwright_semaphore = asyncio.Semaphore(10)
 
 # --- Extract Amazon product price and name from HTML ---
-async def extract_amazon_price_and_name(html: str):
-    soup = BeautifulSoup(html, "html.parser")
-    price_symbol = soup.find("span", class_="a-price-symbol")
-    price_whole = soup.find("span", class_="a-price-whole")
-    price_fraction = soup.find("span", class_="a-price-fraction")
-    title_tag = soup.find("span", id="productTitle")
+def parse_amazon_price_and_name(html: str):
+    """Sync extractor: string-scan fast path, full lxml parse when it misses.
+
+    Returns (Price | None, name); the price text is normalized once here.
+    """
+    price, name = scan_amazon_price_and_name(html or "")
+    record_fast_path("amazon", price is not None)
+    if price is None:
+        price, name = parse_amazon_dom(html)
+    return Price.parse(price), name
+
+
+def parse_amazon_dom(html: str):
+    """Parse the page once with lxml and read price and title."""
+    doc = parse_html(html)
+    if doc is None:
+        return None, None
+    price_symbol = first(doc, f'//span[{has_class("a-price-symbol")}]')
+    price_whole = first(doc, f'//span[{has_class("a-price-whole")}]')
+    price_fraction = first(doc, f'//span[{has_class("a-price-fraction")}]')
+    title_tag = first(doc, '//span[@id="productTitle"]')
     price = None
-    if price_whole:
-        symbol = price_symbol.get_text(strip=True) if price_symbol else ""
-        whole = re.sub(r"[^\d]", "", price_whole.get_text(strip=True))
-        fraction = re.sub(r"[^\d]", "", price_fraction.get_text(strip=True)) if price_fraction else "00"
-        fraction = (fraction + "00")[:2]
-        price = f"{symbol}{whole}.{fraction}"
-    name = title_tag.get_text(strip=True) if title_tag else None
+    if price_whole is not None:
+        price = _format_amazon_price(
+            text_of(price_symbol) if price_symbol is not None else "",
+            text_of(price_whole),
+            text_of(price_fraction) if price_fraction is not None else None,
+        )
+    name = text_of(title_tag) if title_tag is not None else None
     return price, name
 
+
+async def extract_amazon_price_and_name(html: str):
+    return await run_parser(parse_amazon_price_and_name, html)
+
 # --- Robust ASIN extraction from Amazon URLs ---
 def extract_asin_from_url_path(url: str) -> str:
     # Common ASIN patterns
@@ -35,50 +85,3 @@ def extract_asin_from_url_path(url: str) -> str:
             return match.group(1)
     print(f"Could not extract ASIN from URL: {url}")
     return None
-
-# --- Resolve Amazon URLs using Playwright ---
-async def resolve_amazon_url(url: str) -> str:
-    try:
-        async with playwright_semaphore:
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(
-                    headless=True,
-                    args=[
-                        '--no-sandbox',
-                        '--disable-blink-features=AutomationControlled',
-                        '--disable-web-security',
-                        '--disable-dev-shm-usage',
-                        '--no-first-run'
-                    ]
-                )
-                context = await browser.new_context(
-                    viewport={'width': 1366, 'height': 768},
-                    user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36'
-                )
-                page = await context.new_page()
-                await page.add_init_script("""
-                    Object.defineProperty(navigator, 'webdriver', {
-                        get: () => undefined,
-                    });
-                """)
-                await page.goto(url, timeout=10000, wait_until='commit')
-                await page.wait_for_timeout(2000)
-                final_url = page.url
-                await browser.close()
-                return final_url
-    except Exception as e:
-        print(f"Playwright failed to resolve Amazon URL: {e}")
-        return url
-
-# --- Unified ASIN extraction method ---
-async def extract_amazon_asin(text: str) -> str:
-    url_pattern = r"https?://(?:www\.|amzn\.|a\.co|amazon\.)[\w\./\-\?=]+"
-    match = re.search(url_pattern, text)
-    if not match:
-        print(f"No valid Amazon URL found in input: {text}")
-        return None
-    url = match.group(0)
-    resolved_url = await resolve_amazon_url(url)
-    if resolved_url:
-        return extract_asin_from_url_path(resolved_url)
-    return None
@@ -1,32 +1,116 @@
-from bs4 import BeautifulSoup
 import re
+import logging
 from urllib.parse import urlparse
-from playwright.async_api import async_playwright
-import asyncio
+from utils.price import Price
+from utils.parsing import (
+    run_parser, parse_html, has_class, first, text_of,
+    class_element_re, strip_tags, iter_json_ld, record_fast_path,
+)
 
+logger = logging.getLogger(__name__)
 
-playwright_semaphore = asyncio.Semaphore(10)
+_RUPEE_PRICE_RE = re.compile(r"₹\s?\d+")
 
 
-# Extract product name and price from Flipkart product page HTML
-async def extract_flipkart_price_and_name(html: str):
-    soup = BeautifulSoup(html, "html.parser")
+# Fast path markers, tried in the same order as the DOM selectors
+_PRICE_RES = (
+    re.compile(r'<div\b[^>]*\bclass="(?=[^"]*\bNx9bqj\b)(?=[^"]*\bCxhGGd\b)[^"]*"[^>]*>(.*?)</div>', re.S),
+    class_element_re("div", "_30jeq3"),
+)
+_NAME_RES = (
+    class_element_re("h1", "_6EBuvT"),
+    class_element_re("h1", "_35KyD6"),
+    class_element_re("span", "B_NuCI"),
+)
+
+
+def _json_ld_product(html: str):
+    """(price, name) from a schema.org Product block, formatted like the page text."""
+    for item in iter_json_ld(html):
+        types = item.get("@type")
+        if "Product" not in (types if isinstance(types, list) else [types]):
+            continue
+        offers = item.get("offers")
+        if isinstance(offers, list):
+            offers = next((o for o in offers if isinstance(o, dict)), None)
+        if not isinstance(offers, dict):
+            continue
+        try:
+            amount = float(offers.get("price"))
+        except (TypeError, ValueError):
+            continue
+        price = f"₹{amount:,.0f}" if amount.is_integer() else f"₹{amount:,.2f}"
+        return price, item.get("name")
+    return None, None
+
+
+def scan_flipkart_price_and_name(html: str):
+    """String-scan extractor; returns (None, None) unless both fields are found."""
+    price = name = None
+    for pattern in _PRICE_RES:
+        match = pattern.search(html)
+        if match:
+            price = strip_tags(match.group(1))
+            break
+    for pattern in _NAME_RES:
+        match = pattern.search(html)
+        if match:
+            name = strip_tags(match.group(1))
+            break
+    if not price or not name:
+        ld_price, ld_name = _json_ld_product(html)
+        price, name = price or ld_price, name or ld_name
+    if not price or not name:
+        return None, None
+    return price, name
+
+
+# Extract product name and price from Flipkart product page HTML (sync)
+def parse_flipkart_price_and_name(html: str):
+    """String-scan fast path, full lxml parse when it misses.
+
+    Returns (Price | None, name); the price text is normalized once here.
+    """
+    price, name = scan_flipkart_price_and_name(html or "")
+    record_fast_path("flipkart", price is not None)
+    if price is None:
+        price, name = parse_flipkart_dom(html)
+    return Price.parse(price), name
+
+
+def parse_flipkart_dom(html: str):
+    """Parse the page once with lxml and read price and name."""
+    doc = parse_html(html)
+    if doc is None:
+        return None, None
 
     # Attempt to find price (handle dynamic class names if possible)
-    price_tag = (
-        soup.select_one("div.Nx9bqj.CxhGGd") or  
-        soup.select_one("div._30jeq3") or      
-        soup.find(text=re.compile(r"₹\s?\d+"))  # Fallback regex match
-    )
-    price = price_tag.get_text(strip=True) if hasattr(price_tag, "get_text") else str(price_tag).strip() if price_tag else None
+    price_tag = first(doc, f'//div[{has_class("Nx9bqj")} and {has_class("CxhGGd")}]')
+    if price_tag is None:
+        price_tag = first(doc, f'//div[{has_class("_30jeq3")}]')
+    if price_tag is not None:
+        price = text_of(price_tag)
+    else:
+        # Fallback regex match on any text node
+        price = next(
+            (str(t).strip() for t in doc.xpath('//text()[contains(., "₹")]') if _RUPEE_PRICE_RE.search(t)),
+            None,
+        )
 
-    # Attempt to find product name
-    name_tag = soup.select_one("h1._6EBuvT, h1._35KyD6, span.B_NuCI")  # Multiple common selectors
-    name = name_tag.get_text(strip=True) if name_tag else None
+    # Attempt to find product name (multiple common selectors, first in document order)
+    name_tag = first(
+        doc,
+        f'//h1[{has_class("_6EBuvT")}] | //h1[{has_class("_35KyD6")}] | //span[{has_class("B_NuCI")}]',
+    )
+    name = text_of(name_tag) if name_tag is not None else None
 
     return price, name
 
 
+async def extract_flipkart_price_and_name(html: str):
+    return await run_parser(parse_flipkart_price_and_name, html)
+
+
 # Robust PID extraction from Flipkart URLs
 def extract_pid_from_url_path(url: str) -> str:
     parsed = urlparse(url)
@@ -44,62 +128,3 @@ def extract_pid_from_url_path(url: str) -> str:
 
     logger.info(f"Could not extract PID from URL: {url}")
     return None
-
-
-# Resolve Flipkart URLs using Playwright
-async def resolve_flipkart_url(url: str) -> str:
-    """Use Playwright to resolve any Flipkart URL, including short links."""
-    try:
-        async with playwright_semaphore:
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(
-                    headless=True,
-                    args=[
-                        '--no-sandbox',
-                        '--disable-blink-features=AutomationControlled',
-                        '--disable-web-security',
-                        '--disable-dev-shm-usage',
-                        '--no-first-run'
-                    ]
-                )
-                context = await browser.new_context(
-                    viewport={'width': 1366, 'height': 768},
-                    user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36'
-                )
-                page = await context.new_page()
-                
-                # Hide automation indicators
-                await page.add_init_script("""
-                    Object.defineProperty(navigator, 'webdriver', {
-                        get: () => undefined,
-                    });
-                """)
-                
-                await page.goto(url, timeout=10000, wait_until='commit')
-                await page.wait_for_timeout(2000)
-                final_url = page.url
-                
-                await browser.close()
-                return final_url
-            
-    except Exception as e:
-        print(f"Playwright failed to resolve Flipkart URL: {e}")
-        return url
-
-
-# Unified PID extraction method
-async def extract_flipkart_pid(text: str) -> str:
-    """
-    Extract Flipkart product ID using Playwright for all URLs.
-    Accepts text containing a URL and other content.
-    """
-    url_pattern = r"https?://(?:www\.|fkrt\.it|flipkart\.)[\w\./\-\?=]+"
-    match = re.search(url_pattern, text)
-    if not match:
-        print(f"No valid Flipkart URL found in input: {text}")
-        return None
-    url = match.group(0)
-    resolved_url = await resolve_flipkart_url(url)
-    if resolved_url:
-        return extract_pid_from_url_path(resolved_url)
-    return None
@@ -0,0 +1,95 @@
+import re
+import logging
+from typing import NamedTuple
+from utils.price import Price
+from utils.scraper import HTTP_TIER_ENABLED, _http_fetch, _fetch_page, _record_tier
+from utils.amazon import extract_amazon_price_and_name, extract_asin_from_url_path
+from utils.flipkart import extract_flipkart_price_and_name, extract_pid_from_url_path
+from utils.url_normalizer import normalize_product_url, is_short_link, site_of_host
+
+logger = logging.getLogger(__name__)
+
+# site -> (async price/name extractor, product id from a URL path)
+SITES = {
+    "amazon": (extract_amazon_price_and_name, extract_asin_from_url_path),
+    "flipkart": (extract_flipkart_price_and_name, extract_pid_from_url_path),
+}
+
+_LINK_TAG_RE = re.compile(r"<link\b[^>]*>", re.I)
+_HREF_RE = re.compile(r"""\bhref=["']([^"']+)["']""", re.I)
+
+
+class IngestResult(NamedTuple):
+    """Everything handle_message needs from one fetch of a submitted link."""
+    final_url: str | None
+    site: str | None
+    price: Price | None
+    product_name: str | None
+    product_id: str | None
+
+
+def site_of(url: str) -> str | None:
+    return site_of_host(url)
+
+
+def is_supported_url(url: str) -> bool:
+    """Amazon/Flipkart page or one of their short links (checked before any fetch)."""
+    return site_of(url) is not None or is_short_link(url)
+
+
+def product_id_from_url(url: str) -> str | None:
+    """Product id readable straight from a product URL, without loading it."""
+    product = normalize_product_url(url)
+    return product.product_id if product else None
+
+
+def _canonical_url(html: str) -> str | None:
+    for tag in _LINK_TAG_RE.finditer(html, 0, 300_000):
+        if "canonical" in tag.group(0).lower():
+            href = _HREF_RE.search(tag.group(0))
+            if href:
+                return href.group(1)
+    return None
+
+
+async def _extract(final_url: str, html: str) -> IngestResult:
+    site = site_of(final_url)
+    if site is None:
+        return IngestResult(final_url, None, None, None, None)
+    extractor, id_from_path = SITES[site]
+    price, name = await extractor(html)
+    product_id = product_id_from_url(final_url)
+    if not product_id:
+        canonical = _canonical_url(html)
+        product_id = (canonical and product_id_from_url(canonical)) or id_from_path(final_url)
+    return IngestResult(final_url, site, price, name, product_id)
+
+
+async def ingest_url(url: str) -> IngestResult:
+    """Fetch a submitted link once and return its final URL, site, price, name and product id.
+
+    Redirects and short links are followed by the same request that loads
+    the page (HTTP tier first, one shared-browser navigation if that is
+    blocked or yields no price), and the product id is read from the final
+    URL or the page's canonical link instead of resolving the link again.
+    Links to other sites are rejected (site None) without being fetched.
+    """
+    if not is_supported_url(url):
+        return IngestResult(url, None, None, None, None)
+    if HTTP_TIER_ENABLED:
+        html, final_url = await _http_fetch(url)
+        if html:
+            result = await _extract(final_url, html)
+            if result.site is None:
+                return result  # redirected off Amazon/Flipkart: no browser for it
+            if result.price is not None and result.product_id:
+                _record_tier(final_url, "http")
+                return result
+            _record_tier(final_url, "no_price")
+    try:
+        html, final_url = await _fetch_page(url, return_final_url=True)
+    except Exception as e:
+        logger.error("Browser ingest failed for %s: %s", url, e)
+        return IngestResult(None, None, None, None, None)
+    _record_tier(final_url, "browser")
+    return await _extract(final_url, html)
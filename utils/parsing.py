@@ -0,0 +1,133 @@
+"""
+HTML parsing helpers shared by the site extractors.
+
+Parsing a 1–2 MB product page takes tens of milliseconds of pure CPU, so
+extractors never parse on the event loop: ``run_parser`` hands the sync
+parse function to an executor. lxml parses from memory without holding
+the GIL, so the default thread pool gives real parallelism as long as
+each thread has its own parser object (lxml serializes use of a shared
+one); a process pool can be selected for hosts with many idle cores.
+
+PARSE_EXECUTOR: "thread" (default), "process", or "inline" (debugging).
+"""
+
+import os
+import re
+import json
+import asyncio
+import threading
+import html as html_lib
+from collections import defaultdict
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+import lxml.html
+
+PARSE_EXECUTOR = os.getenv("PARSE_EXECUTOR", "thread")
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_executor: Executor | None = None
+
+# Fast-path (string scan) hit/miss counters per site. Counted in whichever
+# process runs the parser (the worker processes when PARSE_EXECUTOR=process).
+_fast_path_stats: dict[str, dict[str, int]] = defaultdict(lambda: {"hit": 0, "miss": 0})
+# One parser per thread: lxml locks a parser object while it is in use
+_parsers = threading.local()
+
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if PARSE_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="html-parse")
+    return _executor
+
+
+async def run_parser(func, html: str):
+    """Run a sync ``func(html)`` parser off the event loop and return its result."""
+    if PARSE_EXECUTOR == "inline":
+        return func(html)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), func, html)
+
+
+def parse_html(html: str):
+    """Parse HTML into an lxml document, or None for empty input."""
+    if not html:
+        return None
+    parser = getattr(_parsers, "html", None)
+    if parser is None:
+        parser = _parsers.html = lxml.html.HTMLParser(encoding="utf-8")
+    # Encode first: lxml refuses str input that carries an encoding declaration
+    return lxml.html.fromstring(html.encode("utf-8", "replace"), parser=parser)
+
+
+def has_class(cls: str) -> str:
+    """XPath predicate matching elements whose class list contains ``cls``."""
+    return f'contains(concat(" ", normalize-space(@class), " "), " {cls} ")'
+
+
+def first(doc, xpath: str):
+    """First node matching ``xpath`` in ``doc``, or None."""
+    found = doc.xpath(xpath)
+    return found[0] if found else None
+
+
+def text_of(el) -> str:
+    """Concatenated stripped text of an element (like BeautifulSoup's get_text(strip=True))."""
+    return "".join(t.strip() for t in el.itertext())
+
+
+# ── Fast path: scan the raw HTML string without building a DOM ──
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_JSON_LD_RE = re.compile(
+    r'<script[^>]*type=["\']application/ld\+json["\'][^>]*>(.*?)</script>', re.S | re.I
+)
+
+
+def class_element_re(tag: str, cls: str, end_tag: str | None = None) -> re.Pattern:
+    """Regex capturing the inner HTML of the first ``<tag class="… cls …">``
+    up to the next ``</end_tag>`` (defaults to ``tag``)."""
+    return re.compile(
+        rf'<{tag}\b[^>]*\bclass="(?:[^"]*\s)?{re.escape(cls)}(?:\s[^"]*)?"[^>]*>(.*?)</{end_tag or tag}>',
+        re.S,
+    )
+
+
+def strip_tags(fragment: str) -> str:
+    """Text of an HTML fragment, stripped per text node like text_of()."""
+    return "".join(html_lib.unescape(part).strip() for part in _TAG_RE.split(fragment))
+
+
+def iter_json_ld(html: str):
+    """Yield every JSON-LD object embedded in the page (lists are flattened)."""
+    for match in _JSON_LD_RE.finditer(html):
+        try:
+            data = json.loads(match.group(1))
+        except ValueError:
+            continue
+        if isinstance(data, dict) and "@graph" in data:
+            data = data["@graph"]
+        for item in data if isinstance(data, list) else [data]:
+            if isinstance(item, dict):
+                yield item
+
+
+def record_fast_path(site: str, hit: bool):
+    _fast_path_stats[site]["hit" if hit else "miss"] += 1
+
+
+def merge_fast_path_stats(stats: dict[str, dict[str, int]]):
+    """Add hit/miss counts reported by another process (a scrape engine worker)."""
+    for site, counts in stats.items():
+        for key in ("hit", "miss"):
+            _fast_path_stats[site][key] += counts.get(key, 0)
+
+
+def get_fast_path_stats() -> dict[str, dict]:
+    """Per-site fast-path hit/miss counts and hit rate."""
+    return {
+        site: {**counts, "hit_rate": round(counts["hit"] / max(1, counts["hit"] + counts["miss"]), 3)}
+        for site, counts in _fast_path_stats.items()
+    }
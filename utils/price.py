@@ -0,0 +1,59 @@
+"""
+Price value type.
+
+Extractors turn page text such as "₹1,299.00" or "Now only ₹ 499" into a
+``Price`` once, at extraction time. Everything downstream (poller
+comparisons, DB columns, Kafka events, notifications, history) works on
+the integer minor units (paise for INR) instead of re-parsing strings.
+"""
+
+import re
+from typing import NamedTuple
+
+DEFAULT_CURRENCY = "INR"
+
+_SYMBOLS = {"₹": "INR", "rs": "INR", "inr": "INR", "$": "USD", "€": "EUR", "£": "GBP"}
+_CURRENCY_SYMBOL = {"INR": "₹", "USD": "$", "EUR": "€", "GBP": "£"}
+_AMOUNT_RE = re.compile(r"\d[\d,]*(?:\.\d+)?")
+_SYMBOL_RE = re.compile(r"₹|\$|€|£|\binr\b|\brs\.?", re.I)
+
+
+class Price(NamedTuple):
+    minor_units: int
+    currency: str = DEFAULT_CURRENCY
+
+    @classmethod
+    def parse(cls, text, default_currency: str = DEFAULT_CURRENCY) -> "Price | None":
+        """Parse free-form price text; returns None when no amount is present."""
+        if text is None:
+            return None
+        if isinstance(text, Price):
+            return text
+        text = str(text)
+        match = _AMOUNT_RE.search(text)
+        if not match:
+            return None
+        whole, _, fraction = match.group(0).replace(",", "").partition(".")
+        symbol = _SYMBOL_RE.search(text)
+        currency = _SYMBOLS.get(symbol.group(0).lower().rstrip("."), default_currency) if symbol else default_currency
+        return cls(int(whole) * 100 + int((fraction + "00")[:2]), currency)
+
+    @classmethod
+    def from_db(cls, minor_units, currency, fallback_text=None) -> "Price | None":
+        """Build from DB columns, parsing the legacy string column if needed."""
+        if minor_units is not None:
+            return cls(minor_units, currency or DEFAULT_CURRENCY)
+        return cls.parse(fallback_text)
+
+    @property
+    def amount(self) -> float:
+        return self.minor_units / 100
+
+    def format(self) -> str:
+        """'₹1,299' or '₹1,299.50' (fraction only when non-zero)."""
+        symbol = _CURRENCY_SYMBOL.get(self.currency, self.currency + " ")
+        whole, fraction = divmod(self.minor_units, 100)
+        return f"{symbol}{whole:,}" + (f".{fraction:02d}" if fraction else "")
+
+    def __str__(self) -> str:
+        return self.format()
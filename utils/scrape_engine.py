@@ -0,0 +1,250 @@
+"""
+Multi-process scrape engine.
+
+A single asyncio process saturates one core with Chromium IPC and HTML
+parsing. The engine spreads scraping over N worker processes; each worker
+runs its own event loop, shared browser, HTTP client and parser, and
+scrapes many URLs concurrently. The main process hands out (job_id, url)
+pairs over a per-worker queue and resolves an asyncio future per job when
+the (price, name) result comes back on the shared result queue. Results
+also carry the worker's fetch-tier and fast-path counter increments, which
+are merged into this process's stats.
+
+A watchdog respawns worker processes that die and fails the jobs they
+held; every job also fails after SCRAPE_JOB_TIMEOUT seconds.
+
+Usage:
+    engine = ScrapeEngine(workers=8)
+    await engine.start()
+    price, name = await engine.scrape(url)
+    await engine.stop()      # drains in-flight work
+"""
+
+import os
+import asyncio
+import logging
+import itertools
+import threading
+import multiprocessing as mp
+
+logger = logging.getLogger(__name__)
+
+# 0 = scrape in the calling process (no engine)
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", "0"))
+# Concurrent scrapes inside each worker process
+SCRAPE_WORKER_CONCURRENCY = int(os.getenv("SCRAPE_WORKER_CONCURRENCY", "5"))
+# Seconds before a scrape on the engine is abandoned
+SCRAPE_JOB_TIMEOUT = float(os.getenv("SCRAPE_JOB_TIMEOUT", "120"))
+# How often the worker processes are checked for liveness (seconds)
+_WATCH_INTERVAL = 1.0
+
+
+async def scrape_product(product_url: str):
+    """Scrape (price, name) for a product URL in this process, or (None, None)."""
+    from utils.scraper import scrape_price
+    if "amazon" in product_url:
+        from utils.amazon import extract_amazon_price_and_name
+        return await scrape_price(product_url, extract_amazon_price_and_name)
+    elif "flipkart" in product_url:
+        from utils.flipkart import extract_flipkart_price_and_name
+        return await scrape_price(product_url, extract_flipkart_price_and_name)
+    return None, None
+
+
+def _counter_snapshot():
+    """Plain {group: {counter: int}} copies of the tier and fast-path counters."""
+    from utils.scraper import get_tier_stats
+    from utils.parsing import get_fast_path_stats
+    fast_path = {site: {"hit": c["hit"], "miss": c["miss"]} for site, c in get_fast_path_stats().items()}
+    return get_tier_stats(), fast_path
+
+
+def _counter_delta(now: dict, before: dict) -> dict:
+    delta = {}
+    for group, counts in now.items():
+        changed = {k: v - before.get(group, {}).get(k, 0) for k, v in counts.items()}
+        changed = {k: v for k, v in changed.items() if v}
+        if changed:
+            delta[group] = changed
+    return delta
+
+
+# ── Worker process side ────────────────────────────────────────
+
+def _worker_main(in_q, out_q, concurrency: int):
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO,
+    )
+    asyncio.run(_worker_loop(in_q, out_q, concurrency))
+
+
+async def _worker_loop(in_q, out_q, concurrency: int):
+    from utils.scraper import close_browser, close_http_client
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    in_flight = set()
+    reported = ({}, {})
+
+    def stats_delta():
+        nonlocal reported
+        now = _counter_snapshot()
+        delta = tuple(_counter_delta(n, b) for n, b in zip(now, reported))
+        reported = now
+        return delta if any(delta) else None
+
+    async def run_job(job_id, url):
+        try:
+            result = await scrape_product(url)
+            out_q.put((job_id, tuple(result), None, stats_delta()))
+        except Exception as e:
+            out_q.put((job_id, None, repr(e), stats_delta()))
+        finally:
+            semaphore.release()
+
+    while True:
+        job = await loop.run_in_executor(None, in_q.get)
+        if job is None:  # shutdown sentinel
+            break
+        await semaphore.acquire()
+        task = asyncio.create_task(run_job(*job))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    if in_flight:
+        await asyncio.gather(*in_flight, return_exceptions=True)
+    await close_http_client()
+    await close_browser()
+
+
+# ── Main process side ──────────────────────────────────────────
+
+class ScrapeEngine:
+    """Pool of scraper processes behind an async ``scrape(url)`` call."""
+
+    def __init__(self, workers: int = SCRAPE_WORKERS,
+                 concurrency: int = SCRAPE_WORKER_CONCURRENCY,
+                 job_timeout: float = SCRAPE_JOB_TIMEOUT):
+        self.workers = max(1, workers)
+        self.concurrency = concurrency
+        self.job_timeout = job_timeout
+        self._ctx = mp.get_context("spawn")  # no forked browser / loop state
+        self._procs = []
+        self._in_queues = []
+        self._load = []  # in-flight jobs per worker
+        self._out_q = None
+        self._futures: dict[int, tuple[asyncio.Future, int]] = {}
+        self._ids = itertools.count()
+        self._loop = None
+        self._reader = None
+        self._watchdog = None
+        self._stopping = False
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._out_q = self._ctx.Queue()
+        for _ in range(self.workers):
+            self._procs.append(None)
+            self._in_queues.append(None)
+            self._load.append(0)
+        for worker in range(self.workers):
+            self._spawn(worker)
+        self._reader = threading.Thread(target=self._read_results, name="scrape-results", daemon=True)
+        self._reader.start()
+        self._watchdog = asyncio.create_task(self._watch_workers())
+        logger.info("Scrape engine started with %d worker processes", self.workers)
+
+    def _spawn(self, worker: int):
+        in_q = self._ctx.Queue()
+        proc = self._ctx.Process(
+            target=_worker_main, args=(in_q, self._out_q, self.concurrency), daemon=True
+        )
+        proc.start()
+        self._procs[worker] = proc
+        self._in_queues[worker] = in_q
+
+    async def _watch_workers(self):
+        """Fail the jobs of worker processes that died, and respawn them."""
+        while True:
+            await asyncio.sleep(_WATCH_INTERVAL)
+            for worker, proc in enumerate(self._procs):
+                if proc.is_alive():
+                    continue
+                lost = [job_id for job_id, (_, w) in self._futures.items() if w == worker]
+                for job_id in lost:
+                    self._resolve(job_id, None, f"worker process exited with code {proc.exitcode}", None)
+                if self._stopping:
+                    continue
+                logger.error("Scrape worker %d exited with code %s, failed %d job(s); respawning",
+                             worker, proc.exitcode, len(lost))
+                old_q = self._in_queues[worker]
+                self._spawn(worker)
+                old_q.cancel_join_thread()
+                old_q.close()
+
+    def _read_results(self):
+        while True:
+            msg = self._out_q.get()
+            if msg is None:
+                return
+            self._loop.call_soon_threadsafe(self._resolve, *msg)
+
+    def _resolve(self, job_id, result, error, stats):
+        if stats:
+            from utils.scraper import merge_tier_stats
+            from utils.parsing import merge_fast_path_stats
+            tiers, fast_path = stats
+            merge_tier_stats(tiers)
+            merge_fast_path_stats(fast_path)
+        fut, worker = self._futures.pop(job_id, (None, None))
+        if fut is None:
+            return
+        self._load[worker] -= 1
+        if fut.done():
+            return
+        if error:
+            fut.set_exception(RuntimeError(f"scrape worker error: {error}"))
+        else:
+            fut.set_result(result)
+
+    async def scrape(self, url: str):
+        """Scrape (price, name) for ``url`` on the least-loaded worker."""
+        if self._stopping:
+            raise RuntimeError("scrape engine is shutting down")
+        worker = min(range(self.workers), key=self._load.__getitem__)
+        job_id = next(self._ids)
+        fut = self._loop.create_future()
+        self._futures[job_id] = (fut, worker)
+        self._load[worker] += 1
+        self._in_queues[worker].put((job_id, url))
+        try:
+            return await asyncio.wait_for(fut, self.job_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"scrape timed out after {self.job_timeout:.0f}s") from None
+        finally:
+            # Timed out or cancelled: forget the job; a late result is ignored
+            if self._futures.pop(job_id, None) is not None:
+                self._load[worker] -= 1
+
+    async def stop(self):
+        """Stop accepting work, wait for in-flight jobs, then stop the workers."""
+        self._stopping = True
+        pending = [fut for fut, _ in self._futures.values()]
+        if pending:
+            logger.info("Draining %d in-flight scrapes", len(pending))
+            await asyncio.gather(*pending, return_exceptions=True)
+        self._watchdog.cancel()
+        await asyncio.gather(self._watchdog, return_exceptions=True)
+        for in_q in self._in_queues:
+            in_q.put(None)
+        await asyncio.to_thread(self._join_workers)
+        self._out_q.put(None)
+        await asyncio.to_thread(self._reader.join)
+        logger.info("Scrape engine stopped")
+
+    def _join_workers(self):
+        for proc in self._procs:
+            proc.join(timeout=30)
+            if proc.is_alive():
+                proc.terminate()
@@ -2,21 +2,72 @@ import re
 import os
 import logging
 import httpx
-from bs4 import BeautifulSoup
 from playwright.async_api import async_playwright, Browser
 import random
 import string
 import asyncio
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
 
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+              'AppleWebKit/537.36 (KHTML, like Gecko) '
+              'Chrome/119.0.0.0 Safari/537.36')
+
+# ── HTTP fast tier ─────────────────────────────────────────────
+# Most product pages are server-rendered, so a plain HTTP/2 GET is enough
+# to read the price. One pooled client keeps TLS sessions and keep-alive
+# connections warm across products; Playwright is only used as a fallback.
+HTTP_TIER_ENABLED = os.getenv("HTTP_TIER_ENABLED", "1") == "1"
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "8"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+
+HTTP_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+
+# Markers of captcha / robot-check interstitials served instead of the product page
+# Markers of the captcha / robot-check interstitials themselves. A bare
+# "captcha" also occurs in ordinary product pages (script bundles, reviews).
+BOT_CHECK_MARKERS = (
+    '/errors/validatecaptcha',          # Amazon captcha form action
+    'api-services-support@amazon.com',
+    'automated access to amazon data',
+)
+# Matched against the <title> only
+BOT_CHECK_TITLES = (
+    'robot check',
+    'are you a human',
+    'captcha',
+)
+_TITLE_RE = re.compile(r'<title[^>]*>(.*?)</title>', re.S | re.I)
+
+_http_client: httpx.AsyncClient | None = None
+
+# Per-domain counters of which tier served the page: {"amazon.in": {"http": 10, "browser": 2, ...}}
+_tier_stats: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
 # ── Persistent browser pool ────────────────────────────────────
 # Instead of launching a new Chromium per request (~500ms+ overhead),
-# we keep ONE browser alive and create lightweight contexts per request.
-# The semaphore limits concurrent pages (not browsers).
+# we keep ONE browser alive and reuse warm contexts/pages per site.
+# The semaphore limits concurrent pages (not browsers); the pool never
+# holds more than MAX_BROWSER_PAGES live contexts.
+MAX_BROWSER_PAGES = int(os.getenv("MAX_BROWSER_PAGES", "10"))
+# Retire a pooled context after this many fetches (or on any error)
+CONTEXT_MAX_USES = int(os.getenv("CONTEXT_MAX_USES", "50"))
+# Keep cookies between uses of a pooled context (storage is always cleared)
+CONTEXT_KEEP_COOKIES = os.getenv("CONTEXT_KEEP_COOKIES", "1") == "1"
+
+_playwright = None
 _browser: Browser | None = None
 _browser_lock = asyncio.Lock()
-_page_semaphore = asyncio.Semaphore(int(os.getenv("MAX_BROWSER_PAGES", "10")))
+_page_semaphore = asyncio.Semaphore(MAX_BROWSER_PAGES)
+_idle_pages: dict[str, list] = defaultdict(list)  # site -> idle _PooledPage items
+_pool_live = 0  # contexts currently open (idle + in use)
 
 BROWSER_ARGS = [
     '--no-sandbox',
@@ -35,9 +86,143 @@ ANTI_DETECT_SCRIPT = """
 """
 
 
+def _get_http_client() -> httpx.AsyncClient:
+    """Return the shared HTTP/2 client, creating it once if needed."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=True,
+            headers=HTTP_HEADERS,
+            follow_redirects=True,
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=60,
+            ),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared HTTP client (call on shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def _domain(url: str) -> str:
+    return urlparse(url).netloc.lower().replace("www.", "")
+
+
+def _record_tier(url: str, tier: str):
+    _tier_stats[_domain(url)][tier] += 1
+
+
+def get_tier_stats() -> dict[str, dict[str, int]]:
+    """Snapshot of per-domain counters for which fetch tier served pages.
+
+    Keys per domain: ``http`` (served without a browser), ``browser``
+    (Playwright fallback), ``bot_check`` (HTTP got a robot page),
+    ``no_price`` (HTTP page had no price), ``http_error``.
+    """
+    return {domain: dict(counts) for domain, counts in _tier_stats.items()}
+
+
+def merge_tier_stats(stats: dict[str, dict[str, int]]):
+    """Add counters reported by another process (a scrape engine worker)."""
+    for domain, counts in stats.items():
+        for tier, n in counts.items():
+            _tier_stats[domain][tier] += n
+
+
+def is_bot_check(html: str) -> bool:
+    """Heuristic: does this HTML look like a captcha / robot-check page?"""
+    head = html[:20000].lower()
+    if any(marker in head for marker in BOT_CHECK_MARKERS):
+        return True
+    title = _TITLE_RE.search(head)
+    return bool(title) and any(marker in title.group(1) for marker in BOT_CHECK_TITLES)
+
+
+async def _http_fetch(url: str):
+    """Fetch a page over plain HTTP. Returns (html, final_url) or (None, None)
+    when the response is unusable and the caller should escalate to the browser."""
+    try:
+        resp = await _get_http_client().get(url)
+    except httpx.HTTPError as e:
+        logger.debug("HTTP tier failed for %s: %s", url, e)
+        _record_tier(url, "http_error")
+        return None, None
+    if resp.status_code != 200:
+        _record_tier(url, "http_error")
+        return None, None
+    html = resp.text
+    if is_bot_check(html):
+        _record_tier(url, "bot_check")
+        return None, None
+    return html, str(resp.url)
+
+
+# ── Resource blocking for browser fetches ──────────────────────
+# The extractors only read a few spans from the HTML, so the browser tier
+# aborts images, fonts, media and styles, and only lets scripts/XHR through
+# from the site's own hosts (ads and trackers are third-party).
+BLOCK_RESOURCES = os.getenv("BLOCK_RESOURCES", "1") == "1"
+BLOCKED_RESOURCE_TYPES = frozenset(
+    t.strip() for t in
+    os.getenv("BLOCKED_RESOURCE_TYPES", "image,media,font,stylesheet,imageset,texttrack").split(",")
+    if t.strip()
+)
+
+# First-party host suffixes allowed per site; anything else (besides the
+# main document) is treated as third-party and aborted.
+SITE_ALLOWED_HOSTS = {
+    "amazon": ("amazon.in", "amazon.com", "media-amazon.com", "ssl-images-amazon.com"),
+    "flipkart": ("flipkart.com", "flixcart.com"),
+}
+
+# Rough transfer sizes used to estimate what a blocked request would have cost
+_EST_RESOURCE_BYTES = {
+    "image": 40_000, "media": 200_000, "font": 30_000, "stylesheet": 25_000,
+    "script": 60_000, "xhr": 5_000, "fetch": 5_000,
+}
+
+
+def _allowed_hosts_for(url: str) -> tuple[str, ...]:
+    domain = _domain(url)
+    for site, hosts in SITE_ALLOWED_HOSTS.items():
+        if site in domain:
+            return hosts
+    return (domain,)
+
+
+def _make_route_handler(url: str, stats: dict):
+    """Build a Playwright route handler that blocks resources for ``url``'s site."""
+    allowed_hosts = _allowed_hosts_for(url)
+
+    async def handler(route):
+        request = route.request
+        rtype = request.resource_type
+        if rtype == "document":
+            stats["allowed"] += 1
+            return await route.continue_()
+        host = urlparse(request.url).netloc.lower()
+        first_party = any(host == h or host.endswith("." + h) for h in allowed_hosts)
+        if rtype in BLOCKED_RESOURCE_TYPES or not first_party:
+            stats["blocked"] += 1
+            stats["bytes_saved"] += _EST_RESOURCE_BYTES.get(rtype, 10_000)
+            return await route.abort()
+        stats["allowed"] += 1
+        return await route.continue_()
+
+    return handler
+
+
 async def _get_browser() -> Browser:
     """Return the shared browser, launching it once if needed."""
-    global _browser
+    global _browser, _playwright
     if _browser and _browser.is_connected():
         return _browser
 
@@ -45,35 +230,164 @@ async def _get_browser() -> Browser:
         # Double-check after acquiring lock
         if _browser and _browser.is_connected():
             return _browser
-        pw = await async_playwright().start()
-        _browser = await pw.chromium.launch(headless=True, args=BROWSER_ARGS)
+        if _playwright is None:
+            _playwright = await async_playwright().start()
+        _browser = await _playwright.chromium.launch(headless=True, args=BROWSER_ARGS)
         logger.info("Launched shared Chromium browser (PID %s)", _browser.process.pid if _browser.process else "?")
         return _browser
 
 
+def _site_key(url: str) -> str:
+    """Pool key for a URL: the known site name, or the bare domain."""
+    domain = _domain(url)
+    for site in SITE_ALLOWED_HOSTS:
+        if site in domain:
+            return site
+    return domain
+
+
+class _PooledPage:
+    """A warm browser context + page bound to one site."""
+
+    def __init__(self, browser, context, page, site):
+        self.browser = browser
+        self.context = context
+        self.page = page
+        self.site = site
+        self.uses = 0
+        self.stats = {"allowed": 0, "blocked": 0, "bytes_saved": 0}
+
+    def is_usable(self, browser) -> bool:
+        return self.browser is browser and browser.is_connected() and self.uses < CONTEXT_MAX_USES
+
+
+async def _new_pooled_page(browser, url: str) -> _PooledPage:
+    site = _site_key(url)
+    context = await browser.new_context(
+        viewport={'width': 1366, 'height': 768},
+        user_agent=USER_AGENT,
+    )
+    try:
+        await context.add_init_script(ANTI_DETECT_SCRIPT)
+        item = _PooledPage(browser, context, None, site)
+        if BLOCK_RESOURCES:
+            await context.route("**/*", _make_route_handler(url, item.stats))
+        item.page = await context.new_page()
+        return item
+    except Exception:
+        await context.close()
+        raise
+
+
+async def _retire(item: _PooledPage):
+    global _pool_live
+    _pool_live -= 1
+    try:
+        await item.context.close()
+    except Exception as e:
+        logger.debug("Error closing pooled context: %s", e)
+
+
+async def _acquire_page(url: str) -> _PooledPage:
+    """Take a warm page for ``url``'s site from the pool, or create one.
+
+    Must be called while holding _page_semaphore, so at most
+    MAX_BROWSER_PAGES items are ever in use at once.
+    """
+    global _pool_live
+    browser = await _get_browser()
+    idle = _idle_pages[_site_key(url)]
+    while idle:
+        item = idle.pop()
+        if item.is_usable(browser):
+            return item
+        await _retire(item)
+
+    # Keep the total number of live contexts bounded: evict an idle one from
+    # another site. Since in-use items are < MAX_BROWSER_PAGES, one exists.
+    if _pool_live >= MAX_BROWSER_PAGES:
+        for items in _idle_pages.values():
+            if items:
+                await _retire(items.pop(0))
+                break
+
+    _pool_live += 1
+    try:
+        return await _new_pooled_page(browser, url)
+    except Exception:
+        _pool_live -= 1
+        raise
+
+
+async def _release_page(item: _PooledPage, failed: bool):
+    """Return a page to the pool after a cheap reset, or retire it."""
+    item.uses += 1
+    if failed or item.uses >= CONTEXT_MAX_USES:
+        await _retire(item)
+        return
+    try:
+        await item.page.evaluate(
+            "() => { try { localStorage.clear(); sessionStorage.clear(); } catch (e) {} }"
+        )
+        if not CONTEXT_KEEP_COOKIES:
+            await item.context.clear_cookies()
+        await item.page.goto("about:blank")
+    except Exception as e:
+        logger.debug("Resetting pooled page failed, retiring it: %s", e)
+        await _retire(item)
+        return
+    _idle_pages[item.site].append(item)
+
+
 async def _fetch_page(url: str, return_final_url: bool = False):
-    """Open a page in a fresh context, return (html, final_url).
+    """Open the page in a pooled context, return (html, final_url).
 
     Uses the shared browser and limits concurrency via _page_semaphore.
     """
     async with _page_semaphore:
-        browser = await _get_browser()
-        context = await browser.new_context(
-            viewport={'width': 1366, 'height': 768},
-            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-                       'AppleWebKit/537.36 (KHTML, like Gecko) '
-                       'Chrome/119.0.0.0 Safari/537.36',
-        )
+        item = await _acquire_page(url)
+        item.stats.update(allowed=0, blocked=0, bytes_saved=0)
+        started = time.monotonic()
+        failed = True
         try:
-            page = await context.new_page()
-            await page.add_init_script(ANTI_DETECT_SCRIPT)
+            page = item.page
             await page.goto(url, timeout=8000, wait_until='commit')
             await page.wait_for_timeout(800)  # Brief delay for dynamic content
             html = await page.content()
             final_url = page.url
+            failed = False
             return (html, final_url) if return_final_url else (html, url)
         finally:
-            await context.close()
+            stats = dict(item.stats)
+            await _release_page(item, failed)
+            if BLOCK_RESOURCES:
+                logger.info(
+                    "Browser fetch %s took %.0fms: %d requests allowed, %d blocked (~%d KB saved)",
+                    _domain(url), (time.monotonic() - started) * 1000,
+                    stats["allowed"], stats["blocked"], stats["bytes_saved"] // 1024,
+                )
+
+
+async def close_browser():
+    """Close pooled contexts, the shared browser and Playwright (call on shutdown)."""
+    global _browser, _playwright, _pool_live
+    for items in _idle_pages.values():
+        for item in items:
+            try:
+                await item.context.close()
+            except Exception:
+                pass
+    _idle_pages.clear()
+    _pool_live = 0
+    if _browser is not None:
+        try:
+            await _browser.close()
+        except Exception as e:
+            logger.debug("Error closing browser: %s", e)
+        _browser = None
+    if _playwright is not None:
+        await _playwright.stop()
+        _playwright = None
 
 
 async def playwright_fetch(url):
@@ -81,21 +395,40 @@ async def playwright_fetch(url):
     return html
 
 
-async def scrapper(url: str):
+async def scrape_price(url: str, extractor):
+    """Scrape (price, name) for a product URL using ``extractor(html)``.
+
+    The HTTP tier is only trusted when the extractor finds a price on it;
+    a bot-check page or a missing price escalates to the shared browser.
+    """
+    if HTTP_TIER_ENABLED:
+        html, _ = await _http_fetch(url)
+        if html:
+            price, name = await extractor(html)
+            if price:
+                _record_tier(url, "http")
+                return price, name
+            _record_tier(url, "no_price")
     try:
         html = await playwright_fetch(url)
-        soup = BeautifulSoup(html, 'lxml')
-        return html, url
     except Exception as e:
         logger.error("Playwright fetch failed: %s", e)
         return None, None
+    _record_tier(url, "browser")
+    return await extractor(html)
 
 
-async def expand_url(url: str) -> str:
-    """Expand shortened URLs to their final destination using Playwright."""
+async def http_resolve(url: str) -> str | None:
+    """Follow a link's HTTP redirects without a browser. Returns the final URL,
+    or None if the server refuses."""
+    client = _get_http_client()
     try:
-        _, final_url = await _fetch_page(url, return_final_url=True)
-        return final_url
-    except Exception as e:
-        logger.error("Playwright expand_url error: %s", e)
-    return url
+        resp = await client.head(url)
+        if resp.status_code >= 400:
+            # Some shorteners reject HEAD; a streamed GET stops after the headers
+            async with client.stream("GET", url) as resp:
+                pass
+    except httpx.HTTPError as e:
+        logger.debug("HTTP redirect resolve failed for %s: %s", url, e)
+        return None
+    return str(resp.url) if resp.status_code < 400 else None
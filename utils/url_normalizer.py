@@ -0,0 +1,131 @@
+import re
+from typing import NamedTuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that only track the click and never change the product
+TRACKING_PARAMS = {
+    "tag", "ref", "ref_", "linkcode", "linkid", "creative", "creativeasin", "camp",
+    "ascsubtag", "smid", "psc", "th", "social_share", "fbclid", "gclid",
+    "affid", "affextparam1", "affextparam2", "cmpid", "_refid", "_appid", "srno", "ssid",
+    "otracker", "otracker1", "lid", "marketplace", "store", "iid", "ppt", "ppn", "spotlighttagid",
+    "qid", "sr", "keywords", "crid", "sprefix", "dib", "dib_tag", "content-id", "encoding",
+}
+TRACKING_PREFIXES = ("utm_", "pf_rd_", "pd_rd_")
+
+# Hosts that only redirect to a product page
+AMAZON_SHORT_HOSTS = {"amzn.to", "amzn.in", "amzn.eu", "amzn.asia", "a.co"}
+FLIPKART_SHORT_HOSTS = {"fkrt.it", "fkrt.cc", "fkrt.co", "fkrt.to"}
+
+_AMAZON_HOST_RE = re.compile(r"(?:^|\.)amazon\.(?:[a-z]{2,3}|com?\.[a-z]{2})$")
+_ASIN = r"([A-Z0-9]{10})"
+_AMAZON_PATH_RES = (
+    re.compile(r"/(?:dp|gp/product|gp/aw/d|gp/offer-listing|o/ASIN|product)/" + _ASIN + r"(?=[/?#]|$)", re.I),
+    re.compile(r"/exec/obidos/(?:ASIN|tg/detail/-)/" + _ASIN + r"(?=[/?#]|$)", re.I),
+)
+# amzn.com/<ASIN> is a permanent alias, not a redirecting short link
+_AMZN_COM_RE = re.compile(r"^/" + _ASIN + r"/?$", re.I)
+_FLIPKART_ITM_RE = re.compile(r"/p/(itm[0-9a-z]+)(?=[/?#]|$)", re.I)
+
+
+class ProductURL(NamedTuple):
+    """A submitted link reduced to its site, product id and canonical URL."""
+    site: str
+    product_id: str
+    url: str
+
+
+def _host(parts) -> str:
+    host = parts.hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def strip_tracking(url: str) -> str:
+    """Drop tracking parameters, fragment and www. so link variants compare equal."""
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)
+    )
+    return urlunsplit(("https", _host(parts), parts.path.rstrip("/") or "/", urlencode(query), ""))
+
+
+def is_short_link(url: str) -> bool:
+    """Does this link need a redirect before it names a product?"""
+    parts = urlsplit(url.strip())
+    host = _host(parts)
+    if host in AMAZON_SHORT_HOSTS or host in FLIPKART_SHORT_HOSTS:
+        return True
+    return host == "dl.flipkart.com" and parts.path.startswith("/s/")
+
+
+def site_of_host(url: str) -> str | None:
+    """"amazon" or "flipkart" for pages (not short links) on their hosts, else None."""
+    parts = urlsplit(url.strip())
+    if parts.scheme not in ("http", "https"):
+        return None
+    host = _host(parts)
+    if host == "amzn.com" or _AMAZON_HOST_RE.search(host):
+        return "amazon"
+    if host == "flipkart.com" or host.endswith(".flipkart.com"):
+        return "flipkart"
+    return None
+
+
+def _amazon(parts, host: str) -> ProductURL | None:
+    if host == "amzn.com":
+        match = _AMZN_COM_RE.match(parts.path)
+        if match:
+            asin = match.group(1).upper()
+            return ProductURL("amazon", asin, f"https://www.amazon.com/dp/{asin}")
+        return None
+    for pattern in _AMAZON_PATH_RES:
+        match = pattern.search(parts.path)
+        if match:
+            break
+    else:
+        asin = next((v for k, v in parse_qsl(parts.query) if k.lower() == "asin"), "")
+        match = re.fullmatch(_ASIN, asin, re.I)
+        if not match:
+            return None
+    asin = match.group(1).upper()
+    # Keep the marketplace (amazon.in, amazon.co.uk ...) but drop m./smile. prefixes
+    marketplace = re.search(r"amazon\..+$", host).group(0)
+    return ProductURL("amazon", asin, f"https://www.{marketplace}/dp/{asin}")
+
+
+def _flipkart(parts) -> ProductURL | None:
+    match = _FLIPKART_ITM_RE.search(parts.path)
+    if not match:
+        return None
+    path = parts.path
+    if path.startswith("/dl/"):  # app deep links mirror the web path
+        path = path[3:]
+    # pid selects the variant (size, colour ...) so it is kept
+    pid = [(k, v) for k, v in parse_qsl(parts.query) if k == "pid"]
+    return ProductURL("flipkart", match.group(1), urlunsplit(("https", "www.flipkart.com", path, urlencode(pid), "")))
+
+
+def normalize_product_url(url: str) -> ProductURL | None:
+    """Site, product id and canonical URL of an Amazon/Flipkart product link,
+    without any network access. None for short links and non-product pages."""
+    parts = urlsplit(url.strip())
+    if parts.scheme not in ("http", "https"):
+        return None
+    host = _host(parts)
+    if host == "amzn.com" or _AMAZON_HOST_RE.search(host):
+        return _amazon(parts, host)
+    if host == "flipkart.com" or host.endswith(".flipkart.com"):
+        return _flipkart(parts)
+    return None
+
+
+async def resolve_product_url(url: str) -> ProductURL | None:
+    """normalize_product_url, following a short link's redirect when needed
+    with a plain HTTP HEAD/GET. None if that does not lead to a product URL
+    (the page fetch in ingest_url follows the link instead)."""
+    product = normalize_product_url(url)
+    if product is not None or not is_short_link(url):
+        return product
+    from utils.scraper import http_resolve
+    final_url = await http_resolve(url)
+    return normalize_product_url(final_url) if final_url else None